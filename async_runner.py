@@ -0,0 +1,183 @@
+"""
+The async_runner drives the station with asyncio. Operator prompts, DUT steps and traceability
+calls run on executors, so the upload of a finished unit overlaps the serial prompt, the checks
+and the tests of the next one.
+"""
+import asyncio
+import logging
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from gui import popups
+
+logger = logging.getLogger("application_logger")
+
+
+class AsyncStation:
+    def __init__(self, kt, logfile, test, trace_workers=4):
+        """
+        Initialize the asyncio runner of the station.
+
+        Args:
+            kt (Kimball_Trace): The traceability system instance.
+            logfile (History): The history of the DUTs.
+            test (TestManager): The test manager of the DUT.
+            trace_workers (int, optional): Traceability calls running at once. Defaults to 4.
+
+        Returns:
+            None
+        """
+        self.kt = kt
+        self.logfile = logfile
+        self.test = test
+        # The GUI windows are not thread safe, every prompt runs on the same thread.
+        self.gui_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gui")
+        # One unit at a time is driven on the DUT.
+        self.dut_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dut")
+        self.trace_executor = ThreadPoolExecutor(max_workers=trace_workers, thread_name_prefix="trace")
+        # Logfile writes of the finished units, in order.
+        self.upload_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="upload")
+        self.units = 0
+        # The windows the steps open from the DUT thread run on the GUI thread too.
+        self.test.gui = self._gui_from_thread
+
+    async def _call(self, executor, function, *args, **kwargs):
+        """
+        Runs a blocking call on an executor.
+
+        Returns:
+            The result of the call.
+        """
+        return await asyncio.get_running_loop().run_in_executor(executor, partial(function, *args, **kwargs))
+
+    def _gui_from_thread(self, function, *args, **kwargs):
+        """
+        Runs a GUI call from an executor thread on the GUI thread and waits for it.
+
+        Returns:
+            The result of the call.
+        """
+        return self.gui_executor.submit(function, *args, **kwargs).result()
+
+    async def gui(self, function, *args, **kwargs):
+        return await self._call(self.gui_executor, function, *args, **kwargs)
+
+    async def dut(self, function, *args, **kwargs):
+        return await self._call(self.dut_executor, function, *args, **kwargs)
+
+    async def trace(self, function, *args, **kwargs):
+        return await self._call(self.trace_executor, function, *args, **kwargs)
+
+    async def run(self):
+        """
+        Runs units until the operator cancels the serial prompt.
+
+        Returns:
+            int: The number of units tested.
+        """
+        operator = None
+        last_scan_time = None
+        upload = None
+        try:
+            while True:
+                operator, last_scan_time = await self.gui(self.test.check_operator, operator, last_scan_time)
+                if operator in [None, '']:
+                    await self.gui(popups.ok, 'Numero de empleado no valido, vuelva a escanear', background_color='red')
+                    operator = None
+                    last_scan_time = None
+                    continue
+
+                # Uploads of the outbox rejected by the traceability system are not recorded, tell the operator.
+                for rejection in self.kt.take_rejections():
+                    await self.gui(popups.ok, f'Resultado no registrado en trazabilidad: {rejection}',
+                                   background_color='red')
+
+                # The upload of the previous unit keeps running while the operator scans this one.
+                serial = await self.gui(popups.serial, 'Serial:', 'Captura de serial')
+                if serial is None:
+                    await self.gui(popups.quick_msg, 'Cerrando la secuencia', display_sec=5)
+                    break
+                if serial == "" or not self.kt.valid_serial(serial, 1):
+                    await self.gui(popups.ok, 'Serial no valido, vuelva a escanear', background_color='red')
+                    continue
+
+                if not await self.trace(self.kt.prevalidate, serial):
+                    if self.kt.prevalidate_failure == "partnumber":
+                        await self.gui(popups.ok, 'El numero de parte escaneado es incorrecto', background_color='red')
+                    else:
+                        await self.gui(popups.ok, self.kt.reply_TracMex, background_color='red')
+                    continue
+
+                unit = await self._test_unit(serial, operator)
+                if unit["is_failure"]:
+                    await self.gui(popups.ok, f'UUT fallo en {unit["failure_name"]}', background_color='red')
+
+                # Uploads stay in order: the previous one ends before this one starts.
+                if upload is not None:
+                    await upload
+                upload = asyncio.create_task(self._upload(unit))
+                self.units += 1
+        finally:
+            if upload is not None:
+                await upload
+            for executor in (self.gui_executor, self.dut_executor, self.trace_executor, self.upload_executor):
+                executor.shutdown(wait=False, cancel_futures=True)
+        return self.units
+
+    async def _test_unit(self, serial, operator):
+        """
+        Runs the test sequence of a unit and takes a snapshot of its results.
+
+        Args:
+            serial (str): The DUT serial number.
+            operator (str): The employee number.
+
+        Returns:
+            dict: The unit data the upload needs, independent of the next unit.
+        """
+        start_time = self.kt.test_start_time
+        self.test.reset_failure()
+        await self.dut(self.test.run_tests)
+        end_time = await self.trace(self.kt.get_date)
+        return {"serial": serial,
+                "operator": operator,
+                "start_time": start_time,
+                "end_time": end_time,
+                "is_failure": self.test.is_failure,
+                "failure_name": self.test.failure_name,
+                "results": list(self.test.results),
+                "step_results": list(self.test.step_results)}
+
+    async def _upload(self, unit):
+        """
+        Writes a finished unit to the history and sends its result to the traceability system.
+
+        Args:
+            unit (dict): The snapshot of _test_unit.
+
+        Returns:
+            None
+        """
+        serial = unit["serial"]
+        try:
+            await self._call(self.upload_executor, self.logfile.add_results_to_logs,
+                             self.kt.part_number, unit["start_time"], unit["end_time"], self.kt.trace_enable,
+                             unit["is_failure"], serial, unit["results"])
+            await self._call(self.upload_executor, self.logfile.add_step_results,
+                             serial, unit["start_time"], unit["step_results"])
+
+            pass_fail = 1
+            failstring = ""
+            if unit["is_failure"]:
+                pass_fail = 0
+                failstring = await self._call(self.upload_executor, self.logfile.get_fail_string,
+                                              unit["failure_name"], serial)
+
+            # replyInsert may already be the reply of the next unit, the upload returns its own.
+            sent, reply = await self.trace(self.kt.send_result, pass_fail, failstring, unit["operator"],
+                                           serial_number=serial, test_start_time=unit["start_time"],
+                                           test_end_time=unit["end_time"], with_reply=True)
+            if not sent:
+                await self.gui(popups.ok, reply, background_color='red')
+        except Exception as e:
+            logger.exception(f"The upload of serial {serial} failed: {e}")
+            await self.gui(popups.ok, f'No se pudo subir el resultado de {serial}: {e}', background_color='red')
@@ -6,10 +6,11 @@ import logging
 logger = logging.getLogger("funcional_log")
 
 class Adb():
-    def __init__(self):
+    def __init__(self, target=None):
         logger.debug(f"Initializing {__class__.__name__}.")
         self.path = r"C:\scrcpy"
-        self.ip = None
+        # The IP:port or serial of the device, None when only one device is connected.
+        self.ip = target
     
     def start_server(self):
         """
@@ -39,6 +40,9 @@ class Adb():
         Run a general ABD command
         """
         command = arg_list if arg_list else str(arg_string).split(" ")
+        # With several devices connected, the command goes to this one.
+        if self.ip and command[:1] == ["adb"] and "-s" not in command:
+            command = ["adb", "-s", self.ip] + command[1:]
 
         p = subprocess.check_output(command, stderr=None)
         print(p.decode('utf-8'))
@@ -13,3 +13,29 @@ class TraceabilityError(Exception):
         """
         self.message = message
         super().__init__(self.message)
+
+
+class SettingsError(Exception):
+    """
+    Exception raise if the settings file is missing a required setting or has a value not allowed.
+    """
+
+    def __init__(self, message="An error in the settings file."):
+        """
+        Raise a settings error.
+        """
+        self.message = message
+        super().__init__(self.message)
+
+
+class TestPlanError(Exception):
+    """
+    Exception raise if the test sequence does not match the test methods or testnames.txt.
+    """
+
+    def __init__(self, message="The test sequence does not match the test methods or testnames.txt."):
+        """
+        Raise a test plan error.
+        """
+        self.message = message
+        super().__init__(self.message)
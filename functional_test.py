@@ -25,9 +25,17 @@ try:
     import sys
     from gui import popups
     from report.kimball import Kimball_Trace
+    from report.trace_async import AsyncTrace
     from report.report import History
+    from report.database import HistoryDB
+    from report.step_stats import StepStatistics
     from test_manager import TestManager
     from utilities.ping import scan_ip
+    from utilities.settings import get_settings
+    from exceptions import TestPlanError
+    import asyncio
+    from async_runner import AsyncStation
+    from slots import SlotScheduler, make_slots
 
 except ImportError as ie:
     logger.exception(f"An error occurred during initial import. Exiting.\n{ie}")
@@ -39,10 +47,68 @@ logger.debug('Importing completed.')
 
 def main():
     kt = Kimball_Trace()
-    logfile = History()
+    settings = get_settings()
     settings_lst = kt.case_settings_lst
+    trace = AsyncTrace(kt,
+                       max_workers=settings.OPTIONS.trace_workers,
+                       timeout=settings.OPTIONS.trace_timeout)
+    logfiles = settings.LOGFILES
+    if logfiles.backend == "sqlite":
+        logfile = HistoryDB()
+    else:
+        logfile = History(writer_mode=logfiles.writer_mode,
+                          fsync_policy=logfiles.fsync_policy,
+                          fsync_rows=logfiles.fsync_rows,
+                          flush_rows=logfiles.flush_rows,
+                          flush_seconds=logfiles.flush_seconds,
+                          archive=logfiles.archive == "on",
+                          station=kt.station_name if logfiles.multi_station == "on" else None)
     
-    test = TestManager(kt.mode, settings_lst)
+    # Running step statistics of the adaptive step order, seeded from the history.
+    step_stats = StepStatistics(window=settings.TestSequence.ordering_window)
+    step_stats.load(logfile.read_step_history(settings.TestSequence.ordering_history_days))
+    step_stats.attach(logfile)
+
+    try:
+        test = TestManager(kt.mode, settings_lst, step_stats=step_stats)
+    except TestPlanError as e:
+        logger.exception(f'The test plan is not valid, {e}')
+        popups.ok(f'{e}', background_color= 'red')
+        logfile.close()
+        trace.shutdown(wait=False)
+        kt.close()
+        return
+
+    # Several DUT slots are tested at once, each one on a thread of its own.
+    if settings.OPTIONS.slots > 1:
+        try:
+            units = SlotScheduler(make_slots(kt, settings, step_stats), logfile).run()
+            logger.debug(f"The sequence ended after {units} units.")
+        except Exception as e:
+            logger.exception(f'The sequence is closing for exception, {e}')
+            popups.quick_msg('Cerrando la secuencia por un error, revisar funcional_log', display_sec= 5)
+        finally:
+            logfile.close()
+            trace.shutdown(wait=False)
+            kt.close()
+        return
+
+    # Only one UUT may be powered on the network, system_start scans it once the unit is on.
+    test.network_scan = scan_ip
+
+    # The asyncio runner overlaps the upload of a unit with the prompts and tests of the next one.
+    if settings.OPTIONS.runner == "async":
+        try:
+            units = asyncio.run(AsyncStation(kt, logfile, test, settings.OPTIONS.trace_workers).run())
+            logger.debug(f"The sequence ended after {units} units.")
+        except Exception as e:
+            logger.exception(f'The sequence is closing for exception, {e}')
+            popups.quick_msg('Cerrando la secuencia por un error, revisar funcional_log', display_sec= 5)
+        finally:
+            logfile.close()
+            trace.shutdown(wait=False)
+            kt.close()
+        return
     operator = None
     last_scan_time = None
     while(True):
@@ -59,33 +125,32 @@ def main():
                 last_scan_time = None
                 continue
 
+            # Uploads of the outbox rejected by the traceability system are not recorded, tell the operator.
+            for rejection in kt.take_rejections():
+                popups.ok(f'Resultado no registrado en trazabilidad: {rejection}', background_color= 'red')
+
             # Ask the DUT serial to operador
             serial = popups.serial('Serial:', 'Captura de serial')
             if serial == None:
                 popups.quick_msg('Cerrando la secuencia', display_sec= 5)
                 logger.info('Sequence is closing')
+                logfile.close()
+                trace.shutdown(wait=False)
+                kt.close()
                 break
             elif serial == "" or not kt.valid_serial(serial, 1):
                 popups.ok('Serial no valido, vuelva a escanear', background_color= 'red')
                 continue
                 
-            if not kt.valid_partnumber(serial):
-                popups.ok('El numero de parte escaneado es incorrecto', background_color= 'red')
-                continue
-            
-            if not kt.start_test():
-                popups.ok(kt.reply_TracMex, background_color= 'red')
+            # Part number check and backcheck run at the same time, re-scans use the cached part number.
+            if not trace.result(trace.prevalidate(serial)):
+                if kt.prevalidate_failure == "partnumber":
+                    popups.ok('El numero de parte escaneado es incorrecto', background_color= 'red')
+                else:
+                    popups.ok(kt.reply_TracMex, background_color= 'red')
                 continue
             # Init test
-            while(True):
-                if not test.system_start():
-                    break
-                
-                list_ip = scan_ip()
-                if len(list_ip) > 1:
-                    popups.ok('Se ha detectado dos UUT encendidas\n'
-                           'apague la que no esta usando', background_color= 'red')
-                    break
+            test.run_tests()
 
             end_time = kt.get_date()
             
@@ -97,19 +162,23 @@ def main():
                                     serial,
                                     test.results
                                     )
+            logfile.add_step_results(serial, kt.test_start_time, test.step_results)
             
             if test.is_failure:
                 pass_fail = 0
                 failure = test.failure_name
-                failstring = logfile.get_fail_string(failure)
+                failstring = logfile.get_fail_string(failure, serial)
                 popups.ok(f'UUT fallo en {test.failure_name}', background_color= 'red')
             
-            if not kt.send_result(pass_fail, failstring, operator):
+            if not kt.send_result(pass_fail, failstring, operator, test_end_time=end_time):
                 popups.ok(kt.replyInsert, background_color= 'red')
                 
         except Exception as e:
             logger.exception(f'The sequence is closing for exception, {e}')
             popups.quick_msg('Cerrando la secuencia por un error, revisar funcional_log', display_sec= 5) 
+            logfile.close()
+            trace.shutdown(wait=False)
+            kt.close()
             sys.exit()
 
 if __name__ == '__main__':
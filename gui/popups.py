@@ -164,7 +164,7 @@ def quick_msg(message, display_sec=10, text_color="white", background_color="bla
     except Exception:
         logger.exception("An Exception occurred when displaying quick message popup window.")
 
-def serial(message, title="CCAR_EOL", text_color=None, background_color=None, size_font=(18)):
+def serial(message, title="CCAR_EOL", text_color=None, background_color=None, size_font=(18), interrupt=None):
     """
     Display a window that prompts the user to enter a serial number 
 
@@ -174,9 +174,11 @@ def serial(message, title="CCAR_EOL", text_color=None, background_color=None, si
         text_color (str, optional): The color of the window text. Keep it simple. Defaults to None.
         background_color (str, optional): The color of the window background. Keep it simple. Defaults to None.
         size_font (int), optional): The text size of the message.
+        interrupt (callable, optional): Checked twice a second; when it returns True the window closes so
+                                        another window can open. Defaults to None.
 
     Returns:
-        str: The serial number entered by the user. None if the window is closed.
+        str: The serial number entered by the user. None if the window is closed, False if it was interrupted.
     """
     try:
         layout = [
@@ -186,7 +188,13 @@ def serial(message, title="CCAR_EOL", text_color=None, background_color=None, si
         window['Key'].bind("<Return>", "_Enter")
 
         while True:
-            event, values = window.read()
+            event, values = window.read(timeout=None if interrupt is None else 500)
+            if event == sg.TIMEOUT_KEY:
+                if interrupt():
+                    logger.debug(f"Popup serial '{message}': interrupted")
+                    window.close()
+                    return False
+                continue
             logger.debug(f"Popup serial '{event}': N/A")
             if event == sg.WINDOW_CLOSED:
                 return None
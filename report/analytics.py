@@ -0,0 +1,251 @@
+"""
+This module computes yield and failure analytics over the DUTs history
+"""
+
+import logging
+from collections import Counter
+from datetime import datetime, time, timedelta
+from report.limits import INFO_COLUMNS
+from report.reader import to_bool
+
+logger = logging.getLogger("DUT_logger")
+
+# Shift name and start time, in order; the last shift runs past midnight.
+default_shifts = [("1st", time(6, 0)), ("2nd", time(14, 0)), ("3rd", time(22, 0))]
+
+# Aggregation dimensions of every row.
+DIMENSIONS = ("all", "hour", "shift", "part_number")
+
+# Label of failures with no step result "False" recorded.
+UNKNOWN_STEP = "unknown"
+
+
+class YieldAnalytics:
+    def __init__(self, shifts=default_shifts):
+        """
+        Initialize empty running aggregates.
+
+        Note: the TestResult column holds TestManager.is_failure, so True means the unit failed.
+
+        Args:
+            shifts (list, optional): (name, start time) tuples in order. Defaults to 06:00, 14:00 and 22:00.
+
+        Returns:
+            None
+        """
+        self.shifts = shifts
+        self.reset()
+
+    def reset(self):
+        """
+        Clears the aggregates.
+
+        Returns:
+            None
+        """
+        # Counters keyed by (dimension, key) or (dimension, key, step).
+        self.tests = Counter()
+        self.fails = Counter()
+        self.retests = Counter()
+        self.units = Counter()
+        self.first_pass = Counter()
+        self.final_pass = Counter()
+        self.pareto = Counter()
+        # Serial number -> (keys of its first test, passed on its last test).
+        self.serials = {}
+
+    def shift_of(self, written):
+        """
+        Gets the shift a datetime belongs to.
+
+        Args:
+            written (datetime): The datetime of the row.
+
+        Returns:
+            str: The shift day and name, e.g. '2024-02-05 3rd'; the night shift keeps the day it started.
+        """
+        day = written.date()
+        clock = written.time()
+        if clock < self.shifts[0][1]:
+            day -= timedelta(days=1)
+            return f"{day} {self.shifts[-1][0]}"
+        name = self.shifts[0][0]
+        for shift, start in self.shifts:
+            if clock >= start:
+                name = shift
+        return f"{day} {name}"
+
+    def _keys(self, written, part_number):
+        """
+        Gets the aggregation keys of a row.
+
+        Returns:
+            tuple: (dimension, key) tuples, one per dimension.
+        """
+        return (("all", ""),
+                ("hour", written.strftime("%Y-%m-%d %H:00")),
+                ("shift", self.shift_of(written)),
+                ("part_number", part_number))
+
+    def add(self, written, part_number, serial, failed, results):
+        """
+        Updates the running aggregates with one test, in constant time.
+
+        Args:
+            written (datetime): When the test ended.
+            part_number (str): The DUT part number.
+            serial (str): The DUT serial number.
+            failed (bool): The TestResult column, True if the unit failed.
+            results (dict): The step values by testname.
+
+        Returns:
+            None
+        """
+        keys = self._keys(written, part_number)
+        step = self.failing_step(results) if failed else None
+        passed = not failed
+        self.tests.update(keys)
+        if failed:
+            self.fails.update(keys)
+            self.pareto.update(key + (step,) for key in keys)
+
+        if serial not in self.serials:
+            self.serials[serial] = (keys, passed)
+            self.units.update(keys)
+            if passed:
+                self.first_pass.update(keys)
+                self.final_pass.update(keys)
+            return
+
+        # Retest: final yield follows the last result, counted on the keys of the first test.
+        self.retests.update(keys)
+        first_keys, last_passed = self.serials[serial]
+        if passed != last_passed:
+            for key in first_keys:
+                self.final_pass[key] += 1 if passed else -1
+        self.serials[serial] = (first_keys, passed)
+
+    def failing_step(self, results):
+        """
+        Gets the step that failed a unit.
+
+        Args:
+            results (dict): The step values by testname.
+
+        Returns:
+            str: The first testname with result "False", 'unknown' if there is none.
+        """
+        for name, value in results.items():
+            if value == "False":
+                return name
+        return UNKNOWN_STEP
+
+    def load(self, rows):
+        """
+        Rebuilds the aggregates from the history rows, column by column.
+
+        Every counter takes one pass over the rows keyed by the tuple of aggregation keys of the
+        row; the counts of each distinct tuple are then added to its dimensions, so the work per
+        row does not grow with the number of dimensions.
+
+        Args:
+            rows (iterable): LogRow tuples in the order they were written, e.g. HistoryReader.read().
+
+        Returns:
+            None
+        """
+        self.reset()
+        written, part_numbers, serials, failed, steps = [], [], [], [], []
+        for row in rows:
+            if row.Date is None:
+                continue
+            written.append(row.Date)
+            part_numbers.append(row.PartNumber)
+            serials.append(row.SerialNumber)
+            failed.append(bool(row.TestResult))
+            steps.append(self.failing_step(row.results) if row.TestResult else None)
+
+        count = len(serials)
+        keys = [self._keys(w, p) for w, p in zip(written, part_numbers)]
+        passed = [not f for f in failed]
+        # First and last row index of every serial number.
+        first = dict(zip(reversed(serials), range(count - 1, -1, -1)))
+        last = dict(zip(serials, range(count)))
+        is_first = [False] * count
+        for i in first.values():
+            is_first[i] = True
+
+        totals = [
+            (self.tests, Counter(keys)),
+            (self.fails, Counter(k for k, f in zip(keys, failed) if f)),
+            (self.retests, Counter(k for k, f in zip(keys, is_first) if not f)),
+            (self.units, Counter(k for k, f in zip(keys, is_first) if f)),
+            (self.first_pass, Counter(k for k, f, p in zip(keys, is_first, passed) if f and p)),
+            (self.final_pass, Counter(keys[first[s]] for s, i in last.items() if passed[i]))]
+        for counter, total in totals:
+            for row_keys, n in total.items():
+                for key in row_keys:
+                    counter[key] += n
+        for (row_keys, step), n in Counter((k, s) for k, s in zip(keys, steps) if s is not None).items():
+            for key in row_keys:
+                self.pareto[key + (step,)] += n
+
+        self.serials = {s: (keys[first[s]], passed[i]) for s, i in last.items()}
+        logger.debug(f"Analytics loaded: {count} tests, {len(self.serials)} units")
+
+    def attach(self, history):
+        """
+        Subscribes to a History so every row it writes updates the aggregates.
+
+        Args:
+            history (History): The history to follow.
+
+        Returns:
+            None
+        """
+        def on_row(data):
+            testnames = history.limits.testnames[1:]
+            results = dict(zip(testnames, data[INFO_COLUMNS:]))
+            self.add(datetime.now(), data[1], str(data[6]), to_bool(str(data[5])) is True, results)
+
+        history.subscribe(on_row)
+
+    def summary(self, dimension="all"):
+        """
+        Gets the yield figures of every key of a dimension.
+
+        Args:
+            dimension (str, optional): 'all', 'hour', 'shift' or 'part_number'. Defaults to 'all'.
+
+        Returns:
+            dict: Per key: tests, units, fails, first_pass_yield, final_yield and retest_rate.
+        """
+        summary = {}
+        for (dim, key), tests in sorted(self.tests.items()):
+            if dim != dimension:
+                continue
+            group = (dim, key)
+            units = self.units[group]
+            summary[key] = {
+                "tests": tests,
+                "units": units,
+                "fails": self.fails[group],
+                "first_pass_yield": self.first_pass[group] / units if units else None,
+                "final_yield": self.final_pass[group] / units if units else None,
+                "retest_rate": self.retests[group] / tests}
+        return summary
+
+    def failure_pareto(self, dimension="all", key=""):
+        """
+        Gets the failures by failing step, most frequent first.
+
+        Args:
+            dimension (str, optional): 'all', 'hour', 'shift' or 'part_number'. Defaults to 'all'.
+            key (str, optional): The key inside the dimension, e.g. an hour or part number. Defaults to "".
+
+        Returns:
+            list: (step, count) tuples.
+        """
+        steps = Counter({step: count for (dim, k, step), count in self.pareto.items()
+                         if dim == dimension and k == key and count})
+        return steps.most_common()
@@ -0,0 +1,97 @@
+"""
+This module compresses the closed daily logfiles
+"""
+
+import os
+import gzip
+import shutil
+import logging
+from contextlib import nullcontext
+from report.locking import FileLock, LOCK_SUFFIX
+
+logger = logging.getLogger("DUT_logger")
+
+# Paths to folders relative to this py file.
+local_path = os.path.dirname(os.path.abspath(__file__))
+logfiles_dir = os.path.join(local_path, 'logfiles')
+
+ARCHIVE_SUFFIX = ".gz"
+
+
+def archive_day(path, locked=False):
+    """
+    Compresses a daily logfile to gzip and removes the original.
+
+    The archive is written to a temporary file of this process and renamed when
+    complete, so a crash never leaves a truncated archive next to a removed logfile.
+
+    Args:
+        path (str): The path to the closed logfile.
+        locked (bool, optional): Hold the advisory lock of the station segment while archiving it.
+            Defaults to False.
+
+    Returns:
+        str: The path of the archive, None on error.
+    """
+    archive_path = path + ARCHIVE_SUFFIX
+    temp_path = f"{archive_path}.{os.getpid()}.tmp"
+    try:
+        with FileLock(path) if locked else nullcontext():
+            if not os.path.exists(path):
+                return None
+            with open(path, mode='rb') as source, gzip.open(temp_path, mode='wb', compresslevel=9) as target:
+                shutil.copyfileobj(source, target)
+            os.replace(temp_path, archive_path)
+            os.remove(path)
+        # Lock file left by a station segment of the day, removed once released.
+        if os.path.exists(path + LOCK_SUFFIX):
+            try:
+                os.remove(path + LOCK_SUFFIX)
+            except OSError:
+                pass
+        logger.debug(f"Logfile archived: {os.path.basename(archive_path)}")
+        return archive_path
+    except Exception as e:
+        logger.exception(f"Error archiving logfile {path}: {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return None
+
+
+def archive_closed_days(current_path, directory=logfiles_dir, station=None):
+    """
+    Compresses the daily logfiles of a directory except the ones of the current day.
+
+    In a folder shared by several stations, each station archives only its own segments,
+    so a station never archives a segment another station still writes.
+
+    Args:
+        current_path (str): The path of the logfile of the current day; no logfile or station
+            segment of that day is archived.
+        directory (str, optional): The logfiles folder. Defaults to report/logfiles.
+        station (str, optional): Multi-station mode; only the CCAR_EOL_<date>.<station>.csv segments
+            are archived, under their lock. Defaults to None (the CCAR_EOL_<date>.csv logfiles).
+
+    Returns:
+        list: The paths of the archives written.
+    """
+    archived = []
+    # CCAR_EOL_MM-DD-YYYY, shared by the logfile and the station segments of the day.
+    current_day = os.path.basename(current_path)[:len("CCAR_EOL_MM-DD-YYYY")]
+    suffix = f".{station}.csv" if station else ".csv"
+    try:
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if not (name.startswith("CCAR_EOL_") and name.endswith(suffix)):
+                continue
+            # Without a station, only the logfiles, not the segments of the stations.
+            if len(name) != len(current_day) + len(suffix):
+                continue
+            if name.startswith(current_day):
+                continue
+            archive_path = archive_day(path, locked=station is not None)
+            if archive_path is not None:
+                archived.append(archive_path)
+    except Exception as e:
+        logger.exception(f"Error archiving closed logfiles: {e}")
+    return archived
@@ -0,0 +1,98 @@
+"""
+This module keeps a small LRU cache with expiring entries for the Traceability lookups
+"""
+
+import time
+import logging
+from collections import OrderedDict
+from threading import Lock
+
+logger = logging.getLogger("traceability_logger")
+
+
+class TTLCache:
+    def __init__(self, maxsize=256, ttl=600):
+        """
+        Initialize an LRU cache whose entries expire after a time to live.
+
+        Args:
+            maxsize (int, optional): The maximum number of entries, the least recently used is evicted. Defaults to 256.
+            ttl (float, optional): Seconds an entry is valid. Defaults to 600.
+
+        Returns:
+            None
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Retrieves a value and marks it as the most recently used.
+
+        Args:
+            key (str): The entry key.
+
+        Returns:
+            The cached value, None if the key is missing or expired.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or time.monotonic() >= entry[1]:
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """
+        Stores a value, evicting the least recently used entry when the cache is full.
+
+        Args:
+            key (str): The entry key.
+            value: The value to cache.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """
+        Removes an entry, or every entry if no key is given.
+
+        Args:
+            key (str, optional): The entry key. Defaults to None (all).
+
+        Returns:
+            None
+        """
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+    def stats(self):
+        """
+        Gets the cache counters.
+
+        Returns:
+            dict: The hits, misses, hit rate and current size.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "hit_rate": self.hits / lookups if lookups else 0.0,
+                    "size": len(self.entries)}
@@ -0,0 +1,128 @@
+"""
+This module serves the Traceability server time from a local monotonic clock
+"""
+
+import time
+import logging
+from datetime import datetime, timedelta
+from threading import Lock
+
+logger = logging.getLogger("traceability_logger")
+
+# Datetime formats the server string is tried with, the first one that parses is kept.
+server_formats = [
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%S",
+    "%m/%d/%Y %I:%M:%S %p",
+    "%m/%d/%Y %H:%M:%S",
+    "%d/%m/%Y %H:%M:%S",
+]
+
+
+class ServerClock:
+    def __init__(self, fetch, resync_seconds=3600, max_drift_seconds=2.0):
+        """
+        Initialize a clock synced with the Traceability server.
+
+        The server time is requested once and stored with the local monotonic time
+        of the request; later timestamps are computed locally from the elapsed
+        monotonic time, in the same string format the server uses.
+
+        Args:
+            fetch (callable): Requests the server datetime string, e.g. Connector.CIMP_GetDateTimeStr.
+            resync_seconds (float, optional): Seconds between syncs with the server. Defaults to 3600.
+            max_drift_seconds (float, optional): Resync when the local wall clock moves this many seconds
+                away from the monotonic clock, e.g. after an NTP correction or sleep. Defaults to 2.0.
+
+        Returns:
+            None
+        """
+        self.fetch = fetch
+        self.resync_seconds = resync_seconds
+        self.max_drift_seconds = max_drift_seconds
+        self.lock = Lock()
+        self.server_time = None
+        self.synced_at = None
+        self.wall_offset = None
+        self.format = None
+        self.syncs = 0
+
+    def sync(self):
+        """
+        Requests the server time and records it against the monotonic clock.
+
+        The request latency is split in half to estimate the server time at the monotonic reading.
+
+        Returns:
+            str: The server datetime string.
+        """
+        start = time.monotonic()
+        str_date = self.fetch()
+        end = time.monotonic()
+        server_time, server_format = self._parse(str_date)
+        if server_time is None:
+            logger.debug(f"Server datetime format not recognized, it is not cached: {str_date}")
+            self.server_time = None
+            return str_date
+
+        self.synced_at = (start + end) / 2
+        self.server_time = server_time
+        self.format = server_format
+        self.wall_offset = time.time() - self.synced_at
+        self.syncs += 1
+        logger.debug(f"Server clock synced: {str_date}, request took {end - start:.3f} s")
+        return str_date
+
+    def _parse(self, str_date):
+        """
+        Parses the server datetime string.
+
+        Args:
+            str_date (str): The datetime string of the server.
+
+        Returns:
+            tuple: The datetime and the format that parsed it, (None, None) if no format matches.
+        """
+        for server_format in ([self.format] if self.format else []) + server_formats:
+            try:
+                return datetime.strptime(str(str_date).strip(), server_format), server_format
+            except ValueError:
+                continue
+        return None, None
+
+    def drift(self):
+        """
+        Gets how far the local wall clock moved from the monotonic clock since the last sync.
+
+        Returns:
+            float: The drift in seconds, 0 if the clock was never synced.
+        """
+        if self.synced_at is None:
+            return 0.0
+        return abs((time.time() - time.monotonic()) - self.wall_offset)
+
+    def needs_sync(self):
+        """
+        Checks if the clock must be synced with the server before serving a timestamp.
+
+        Returns:
+            bool: True if never synced, the resync interval passed or the drift exceeds the threshold.
+        """
+        return (self.server_time is None
+                or time.monotonic() - self.synced_at >= self.resync_seconds
+                or self.drift() > self.max_drift_seconds)
+
+    def now(self):
+        """
+        Gets the current server datetime string, syncing with the server only when needed.
+
+        Returns:
+            str: The server datetime string.
+        """
+        with self.lock:
+            if self.needs_sync():
+                return self.sync()
+            elapsed = time.monotonic() - self.synced_at
+            current = self.server_time + timedelta(seconds=elapsed)
+            return current.strftime(self.format)
@@ -0,0 +1,368 @@
+"""
+This module stores the DUTs test history in a local SQLite database
+"""
+
+import os
+import csv
+import sqlite3
+import logging
+from datetime import datetime, timedelta
+from threading import Lock
+from report.report import History, logfiles_dir
+from report.limits import INFO_COLUMNS
+
+logger = logging.getLogger("DUT_logger")
+
+# Paths to folders relative to this py file.
+local_path = os.path.dirname(os.path.abspath(__file__))
+db_path = os.path.join(local_path, 'history.db')
+
+_schema = """
+CREATE TABLE IF NOT EXISTS units (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT NOT NULL,
+    time TEXT NOT NULL,
+    part_number TEXT,
+    start_time TEXT,
+    end_time TEXT,
+    trace_enable TEXT,
+    test_result TEXT,
+    serial_number TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS steps (
+    unit_id INTEGER NOT NULL REFERENCES units(id),
+    test_name TEXT NOT NULL,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_units_serial ON units(serial_number);
+CREATE INDEX IF NOT EXISTS idx_units_part_number ON units(part_number);
+CREATE INDEX IF NOT EXISTS idx_units_date ON units(date);
+CREATE INDEX IF NOT EXISTS idx_units_result ON units(test_result);
+CREATE INDEX IF NOT EXISTS idx_steps_unit ON steps(unit_id);
+CREATE INDEX IF NOT EXISTS idx_steps_value ON steps(value, test_name);
+CREATE TABLE IF NOT EXISTS step_times (
+    date TEXT NOT NULL,
+    serial_number TEXT NOT NULL,
+    start_time TEXT,
+    step TEXT NOT NULL,
+    duration REAL,
+    measurement TEXT,
+    verdict TEXT,
+    error TEXT,
+    position INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_step_times_step ON step_times(step, date);
+"""
+
+_unit_columns = ["date", "time", "part_number", "start_time", "end_time",
+                 "trace_enable", "test_result", "serial_number"]
+
+
+class HistoryDB(History):
+    def __init__(self, path=db_path):
+        """
+        Initialize the SQLite history backend and create the database if it doesn't exist.
+
+        Args:
+            path (str, optional): The path to the database file. Defaults to report/history.db.
+
+        Returns:
+            None
+        """
+        self.db_path = path
+        self.lock = Lock()
+        self.connection = None
+        try:
+            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.connection.row_factory = sqlite3.Row
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript(_schema)
+            self._migrate()
+            logger.debug(f"History database opened: {self.db_path}")
+        except Exception as e:
+            logger.exception(f"An error occurred when opening the history database: {e}")
+        super().__init__()
+
+    def _migrate(self):
+        """
+        Adds the columns of newer versions to a database made by an older one.
+
+        Returns:
+            None
+        """
+        columns = [row["name"] for row in self.connection.execute("PRAGMA table_info(step_times)")]
+        if "position" not in columns:
+            with self.connection:
+                self.connection.execute("ALTER TABLE step_times ADD COLUMN position INTEGER")
+
+    def _create_log(self):
+        """
+        Tracks the name of the current day logfile; rows are written to the database instead.
+
+        Returns:
+            None
+        """
+        self.logfile_path = self._generate_logfile_path()
+
+    def _write_row(self, data):
+        """
+        Inserts a unit and its step results in a single transaction.
+
+        Args:
+            data (list): The row in logfile layout.
+
+        Returns:
+            None
+        """
+        unit = [datetime.now().strftime("%Y-%m-%d")] + [str(value) for value in data[:INFO_COLUMNS]]
+        testnames = self.limits.testnames[1:]
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                f"INSERT INTO units ({', '.join(_unit_columns)}) VALUES ({', '.join('?' * len(_unit_columns))})",
+                unit)
+            steps = [(cursor.lastrowid, name, str(value))
+                     for name, value in zip(testnames, data[INFO_COLUMNS:]) if value != ""]
+            self.connection.executemany(
+                "INSERT INTO steps (unit_id, test_name, value) VALUES (?, ?, ?)", steps)
+
+    def add_step_results(self, SerialNumber, StartTime, step_results):
+        """
+        Inserts the timing and verdict of every step of a unit.
+
+        Args:
+            SerialNumber (str): The DUT serial number.
+            StartTime (str): The start time of the test.
+            step_results (list): The StepResult records of the unit.
+
+        Returns:
+            None
+        """
+        if not step_results:
+            return
+        try:
+            date = datetime.now().strftime("%Y-%m-%d")
+            rows = [(date, str(SerialNumber), str(StartTime), result.name, result.duration,
+                     result.measurement, str(result.verdict), result.error, result.position)
+                    for result in step_results]
+            with self.lock, self.connection:
+                self.connection.executemany(
+                    "INSERT INTO step_times (date, serial_number, start_time, step, duration, measurement, "
+                    "verdict, error, position) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._notify_steps(step_results)
+        except Exception as e:
+            logger.exception(f"Error adding step results: {e}")
+
+    def read_step_history(self, days=7):
+        """
+        Reads the step runs of the last days.
+
+        Args:
+            days (int, optional): The number of days read. Defaults to 7.
+
+        Returns:
+            list: (step, duration, verdict) tuples, oldest first.
+        """
+        try:
+            since = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+            with self.lock:
+                return [(row["step"], row["duration"], row["verdict"]) for row in self.connection.execute(
+                    "SELECT step, duration, verdict FROM step_times WHERE date > ? ORDER BY rowid", (since,))]
+        except Exception as e:
+            logger.exception(f"Error reading the step history: {e}")
+            return []
+
+    def _tail_row(self, path, serial=None, block_size=None):
+        """
+        Retrieves the last row of the day from the database; used when the row is not indexed.
+
+        Args:
+            path (str): The path of the day logfile, only its date is used.
+            serial (str, optional): Return the last row of this serial number. Defaults to None (any serial).
+            block_size (int, optional): Unused, kept for the History signature.
+
+        Returns:
+            list: The row in logfile layout, None if there is no matching row.
+        """
+        try:
+            date = self._logfile_date(path)
+            query = "SELECT * FROM units WHERE date = ?"
+            params = [date]
+            if serial is not None:
+                query += " AND serial_number = ?"
+                params.append(str(serial))
+            with self.lock:
+                unit = self.connection.execute(query + " ORDER BY id DESC LIMIT 1", params).fetchone()
+            return self._unit_row(unit) if unit is not None else None
+        except Exception as e:
+            logger.exception(f"Error reading the last row: {e}")
+            return None
+
+    def _logfile_date(self, path):
+        """
+        Converts a logfile name CCAR_EOL_MM-DD-YYYY.csv to the database date YYYY-MM-DD.
+
+        Args:
+            path (str): The logfile path or name.
+
+        Returns:
+            str: The date of the logfile.
+        """
+        day = os.path.basename(path)[len("CCAR_EOL_"):len("CCAR_EOL_MM-DD-YYYY")]
+        return datetime.strptime(day, "%m-%d-%Y").strftime("%Y-%m-%d")
+
+    def _unit_row(self, unit):
+        """
+        Rebuilds the logfile row of a unit.
+
+        Args:
+            unit (sqlite3.Row): The unit record.
+
+        Returns:
+            list: The row in logfile layout.
+        """
+        with self.lock:
+            steps = self.connection.execute(
+                "SELECT test_name, value FROM steps WHERE unit_id = ?", (unit["id"],)).fetchall()
+        row = [unit[column] for column in _unit_columns[1:]] + [""] * self.limits.test_count
+        for step in steps:
+            column = self.limits.column_index.get(step["test_name"])
+            if column is not None:
+                row[column] = step["value"]
+        return row
+
+    def close(self):
+        """
+        Closes the database connection.
+
+        Returns:
+            None
+        """
+        try:
+            if self.connection is not None:
+                with self.lock:
+                    self.connection.close()
+                    self.connection = None
+        except Exception as e:
+            logger.exception(f"Error closing the history database: {e}")
+
+    def was_tested(self, serial):
+        """
+        Checks if a serial number has been tested before.
+
+        Args:
+            serial (str): The DUT serial number.
+
+        Returns:
+            bool: True if there is at least one unit record of the serial number.
+        """
+        with self.lock:
+            unit = self.connection.execute(
+                "SELECT 1 FROM units WHERE serial_number = ? LIMIT 1", (str(serial),)).fetchone()
+        return unit is not None
+
+    def get_units(self, serial=None, part_number=None, test_result=None, date_from=None, date_to=None, limit=None):
+        """
+        Retrieves unit records matching the filters, newest first.
+
+        Args:
+            serial (str, optional): The DUT serial number. Defaults to None (any).
+            part_number (str, optional): The DUT part number. Defaults to None (any).
+            test_result (str, optional): The TestResult column value, 'True' for failures. Defaults to None (any).
+            date_from (str, optional): First date included, YYYY-MM-DD. Defaults to None.
+            date_to (str, optional): Last date included, YYYY-MM-DD. Defaults to None.
+            limit (int, optional): Maximum number of records. Defaults to None (all).
+
+        Returns:
+            list: A list of dicts with the unit columns.
+        """
+        query, params = self._where(serial, part_number, test_result, date_from, date_to)
+        query = f"SELECT * FROM units{query} ORDER BY id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(int(limit))
+        with self.lock:
+            return [dict(unit) for unit in self.connection.execute(query, params)]
+
+    def get_steps(self, unit_id):
+        """
+        Retrieves the step results of a unit.
+
+        Args:
+            unit_id (int): The id of the unit record.
+
+        Returns:
+            dict: The step values by testname.
+        """
+        with self.lock:
+            steps = self.connection.execute(
+                "SELECT test_name, value FROM steps WHERE unit_id = ?", (unit_id,)).fetchall()
+        return {step["test_name"]: step["value"] for step in steps}
+
+    def failure_counts(self, part_number=None, date_from=None, date_to=None):
+        """
+        Counts the failed steps ("False" results), most frequent first.
+
+        Args:
+            part_number (str, optional): The DUT part number. Defaults to None (any).
+            date_from (str, optional): First date included, YYYY-MM-DD. Defaults to None.
+            date_to (str, optional): Last date included, YYYY-MM-DD. Defaults to None.
+
+        Returns:
+            list: A list of (testname, count) tuples.
+        """
+        query, params = self._where(None, part_number, None, date_from, date_to)
+        query = ("SELECT steps.test_name, COUNT(*) AS fails FROM steps "
+                 "JOIN units ON units.id = steps.unit_id"
+                 + (query + " AND" if query else " WHERE")
+                 + " steps.value = 'False' GROUP BY steps.test_name ORDER BY fails DESC")
+        with self.lock:
+            return [(row["test_name"], row["fails"]) for row in self.connection.execute(query, params)]
+
+    def _where(self, serial, part_number, test_result, date_from, date_to):
+        """
+        Builds the WHERE clause of the unit filters.
+
+        Returns:
+            tuple: The clause (empty if no filter) and its parameters list.
+        """
+        conditions = []
+        params = []
+        for column, operator, value in (("serial_number", "=", serial),
+                                        ("part_number", "=", part_number),
+                                        ("test_result", "=", test_result),
+                                        ("date", ">=", date_from),
+                                        ("date", "<=", date_to)):
+            if value is not None:
+                conditions.append(f"units.{column} {operator} ?")
+                params.append(str(value))
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+    def export_csv(self, date, path=None):
+        """
+        Exports a day of the database with the legacy logfile layout.
+
+        Args:
+            date (str): The day to export, YYYY-MM-DD.
+            path (str, optional): The output CSV path. Defaults to logfiles/CCAR_EOL_MM-DD-YYYY.csv.
+
+        Returns:
+            str: The path of the CSV written, None on error.
+        """
+        try:
+            if path is None:
+                day = datetime.strptime(date, "%Y-%m-%d").strftime("%m-%d-%Y")
+                path = os.path.join(logfiles_dir, f"CCAR_EOL_{day}.csv")
+            with self.lock:
+                units = self.connection.execute(
+                    "SELECT * FROM units WHERE date = ? ORDER BY id", (date,)).fetchall()
+            with open(path, mode='w', newline='') as file:
+                writer = csv.writer(file)
+                self._write_header(writer)
+                for unit in units:
+                    writer.writerow(self._unit_row(unit))
+            logger.debug(f"Exported {len(units)} units of {date} to {path}")
+            return path
+        except Exception as e:
+            logger.exception(f"Error exporting history to CSV: {e}")
+            return None
@@ -3,13 +3,18 @@ This module is for Kimball Traceability system
 """
 
 import os
-import clr
-from configparser import ConfigParser
+import copy
+from threading import Thread, Event
 from pathlib import Path
 from datetime import datetime
 import logger as log
 from exceptions import TraceabilityError
-from utilities.utilities import get_value_ini
+from utilities.settings import get_settings
+from report.clock import ServerClock
+from report.outbox import TraceOutbox
+from report.cache import TTLCache
+from report.metrics import InstrumentedConnector, CircuitBreaker
+from concurrent.futures import ThreadPoolExecutor
 
 # Paths to folders relative to this py file.
 local_path = os.path.dirname(os.path.abspath(__file__))
@@ -28,41 +33,90 @@ logger = log.make_logger(
 )
 
 class Kimball_Trace:
-    def __init__(self):
+    def __init__(self, connector=None, trace_enable=None):
+        """
+        Reads the traceability settings and connects to the WSConnector of the traceability system.
+
+        Parameter:
+                connector (object, optional) - A connector to use instead of loading WSConnector.dll,
+                                               e.g. test/fake_connector.py. Otherwise the DLL is
+                                               loaded on a background thread.
+                trace_enable (String, optional) - 'on' or 'off', overrides trace_enable of settings.ini.
+
+        Exception:
+                An exception arises when the WSConnector cannot be loaded.
+        """
         try:
             logger.debug(f"Initializing {__class__.__name__}")
-            settings_fname = "settings.ini"
-            config = ConfigParser()
-            config.read(os.path.join(parent_path, 'settings', settings_fname))
+            settings = get_settings()
+            options = settings.OPTIONS
             
             # Make a list of the settings to reference for TODO IMEI and ICCID
-            self.case_settings_lst = [(s, dict(config.items(s))) for s in config.sections()]
+            self.case_settings_lst = settings.as_list()
             
-            self.wsconnector_path = config["PATHS"]["wsconnector_path"]
-            self.newtonsoftjson_path = config["PATHS"]["newtonsoftjson_path"]
+            self.wsconnector_path = settings.PATHS.wsconnector_path
+            self.newtonsoftjson_path = settings.PATHS.newtonsoftjson_path
             
             # Settings to be used
             self.is_status_set = False
             
             # Lowercase the status in case of user input error.
-            self.trace_enable = (config["OPTIONS"]["trace_enable"]).lower()
-            self.mode = (config["OPTIONS"]["mode"]).lower()
+            self.trace_enable = (trace_enable or options.trace_enable).lower()
+            self.mode = options.mode
             logger.debug(f"Testing mode is: {self.mode}")
-            self.part_number = config["STATION"]["part_number"]
-            self.process_name = config["STATION"]["process_name"]
-            self.station_name = config["STATION"]["station_name"]
+            self.part_number = settings.STATION.part_number
+            self.process_name = settings.STATION.process_name
+            self.station_name = settings.STATION.station_name
+
+            # Server timestamps are served locally between syncs.
+            self.clock = ServerClock(
+                lambda: self.connector.CIMP_GetDateTimeStr(),
+                resync_seconds=options.clock_resync_minutes * 60,
+                max_drift_seconds=options.clock_max_drift_seconds)
+            
+            self.outbox = None
+            self.executor = None
+            self.parent = None
+            # Slot contexts made by slot_context, their worker pools are shut down by close.
+            self.contexts = []
+            self.warmup = None
+            self.connector_error = None
+            self.connector_ready = Event()
+            self._connector = None
+            self.alternate_executor = None
+            self.replyAlternates = {}
+
+            # Type codes of the alternate identifiers by keyname, the keys are lowercase.
+            self.alternate_types = dict(settings.INSERT_CODE)
+            self.alternate_workers = options.alternate_workers
+            self.prevalidate_failure = None
+
+            # Part numbers of the serials already scanned, a re-scan skips the server lookup.
+            self.partnumber_cache = TTLCache(maxsize=options.partnumber_cache_size, ttl=options.partnumber_cache_ttl)
             
             # If the Traceability is desactivated in settings, no actions associated with the system will be executed.
             if not self.is_traceability_enable():
                 logger.debug(f'The traceability system is disabled.')
                 return None
+
+            # Uploads are journaled first and delivered by the outbox in the background.
+            if options.outbox == "on":
+                self.outbox = TraceOutbox({"result": self._deliver_result, "alternate": self._deliver_alternate})
             
-            clr.AddReference(self.newtonsoftjson_path)
-            clr.AddReference(self.wsconnector_path)
-            
-            from WSConnector import Connector
+            # Every connector call is timed and stops being made while the server is down.
+            breaker = CircuitBreaker(failure_threshold=options.breaker_failures,
+                                     reset_seconds=options.breaker_reset_seconds)
+            timeout = options.trace_timeout
+
+            if connector is not None:
+                self.connector = InstrumentedConnector(connector, breaker, timeout)
+                logger.debug(f"Using the injected connector {type(connector).__name__}")
+                return None
 
-            self.connector = Connector()
+            # pythonnet and the DLLs load in the background while the operator scans the badge.
+            self.warmup = Thread(target=self._load_connector, args=(breaker, timeout),
+                                 name="ConnectorWarmup", daemon=True)
+            self.warmup.start()
             
         # Execute except block if module error occurs.
         except ModuleNotFoundError:
@@ -74,6 +128,82 @@ class Kimball_Trace:
             logger.exception("An error occurred when making connection with Traceability system.")
             raise
 
+    def _load_connector(self, breaker, timeout):
+        """
+        Loads pythonnet and the .NET DLLs and makes the WSConnector; runs on the warm-up thread.
+
+        Parameter:
+                breaker (CircuitBreaker) - The circuit breaker of the connector calls.
+                timeout (float) - Seconds after which a connector call counts as a failure.
+
+        Returns:
+                None
+        """
+        try:
+            import clr
+            clr.AddReference(self.newtonsoftjson_path)
+            clr.AddReference(self.wsconnector_path)
+
+            from WSConnector import Connector
+
+            self._connector = InstrumentedConnector(Connector(), breaker, timeout)
+            logger.debug("The WSConnector is loaded.")
+        except Exception as e:
+            self.connector_error = e
+            logger.exception("An error occurred when loading the WSConnector of the Traceability system.")
+        finally:
+            self.connector_ready.set()
+
+    @property
+    def connector(self):
+        """
+        The WSConnector; the first use waits for the warm-up thread if it has not finished.
+
+        Exception:
+                TraceabilityError - If the WSConnector could not be loaded or the traceability is disabled.
+        """
+        if self._connector is not None:
+            return self._connector
+        if getattr(self, "parent", None) is not None:
+            return self.parent.connector
+        if self.warmup is None:
+            raise TraceabilityError("The WSConnector is not loaded, the traceability system is disabled.")
+        self.connector_ready.wait()
+        if self._connector is None:
+            raise TraceabilityError(f"The WSConnector could not be loaded: {self.connector_error}")
+        return self._connector
+
+    @connector.setter
+    def connector(self, connector):
+        self._connector = connector
+
+    def slot_context(self):
+        """
+        Makes the traceability context of a station slot.
+
+        The context has its own unit state (serial number, start time and replies) and worker
+        pools, and shares the connector, clock, caches and outbox of this instance, so several
+        slots can check and upload units at the same time. close() of this instance also shuts
+        down the pools of its contexts.
+
+        Returns:
+                (Kimball_Trace) - The context of the slot.
+        """
+        context = copy.copy(self)
+        context.parent = self
+        context.contexts = []
+        context.executor = None
+        context.alternate_executor = None
+        context.serial_number = None
+        context.test_start_time = None
+        context.test_end_time = None
+        context.reply_TracMex = None
+        context.replyInsert = None
+        context.replyAlternates = {}
+        context.prevalidate_failure = None
+        self.contexts.append(context)
+        return context
+
     def valid_serial(self, serial_number , length = 30):
         """
         Verifies if the serial number passed on is of the correct length
@@ -124,11 +254,15 @@ class Kimball_Trace:
             self.serial_number = serial_number
 
             # Part number is tracked with the serial number
-            reply_part_number, _ =  self.connector.CIMP_PartNumberRef(self.serial_number, 1, _)
+            reply_part_number = self.partnumber_cache.get(self.serial_number)
+            if reply_part_number is None:
+                reply_part_number, _ =  self.connector.CIMP_PartNumberRef(self.serial_number, 1, _)
 
-            if reply_part_number == '' or reply_part_number == 'One or more errors occurred.':
-                raise TraceabilityError('Connection error to the Traceability system.')
-            elif not reply_part_number == self.part_number:
+                if reply_part_number == '' or reply_part_number == 'One or more errors occurred.':
+                    raise TraceabilityError('Connection error to the Traceability system.')
+                self.partnumber_cache.put(self.serial_number, reply_part_number)
+
+            if not reply_part_number == self.part_number:
                 logger.debug("The serial number scanned is incorrect DUT.")
                 return False
             else:
@@ -142,12 +276,13 @@ class Kimball_Trace:
             logger.exception("An exception was raised in verifying scanned serial number.")
             raise
 
-    def start_test(self):
+    def start_test(self, serial_number=None):
         """
         Checks if the DUT is undergoing the correct process and then, collects the start time of test.
 
         Parameter:
-                None
+                serial_number (String, optional) - The serial number on the DUT. Defaults to the one
+                                                   checked by valid_partnumber, set it to run both checks at once.
 
         Returns:
                 (Boolean) - The result of whether the method was executed successfully. 
@@ -158,6 +293,8 @@ class Kimball_Trace:
         self.reply_TracMex = None
         self.test_start_time = None
         self.test_end_time = None   
+        if serial_number is not None:
+            self.serial_number = serial_number
         try:
             # Request the start time (initial).
             self.test_start_time = self.get_date()
@@ -168,13 +305,13 @@ class Kimball_Trace:
 
             replyBackCheck = self.connector.BackCheck_Serial(self.serial_number, self.station_name)
             logger.debug(f"Serial: {self.serial_number}, bk: {replyBackCheck}")
-            status = replyBackCheck.split('|')[0]
+            status = replyBackCheck.split('|')[0].strip()
             self.reply_TracMex = replyBackCheck.split('|')[1]
             
             if self.reply_TracMex == 'One or more errors occurred.':
                 raise TraceabilityError(f"An Error ocurred as process name does not match: {replyBackCheck}.")
             
-            if not status == 1:
+            if not status == "1":
                 self.reply_TracMex = self.reply_TracMex.split('.')[0]
                 return False
             
@@ -187,7 +324,43 @@ class Kimball_Trace:
             logger.exception("An error occurred when indicating starting of tests in the traceability system.")
             raise
     
-    def send_result(self, test_result, fail_string, employee):
+    def prevalidate(self, serial_number):
+        """
+        Runs the part number check and the backcheck of a serial number at the same time.
+
+        Parameter:
+                serial_number (String) - The serial number on the DUT.
+
+        Returns:
+                (Boolean) - True if both checks passed. On False, prevalidate_failure is set to
+                            'partnumber' or 'backcheck' (with the reply in reply_TracMex).
+
+        Exception:
+                The exceptions of valid_partnumber and start_test are raised.
+        """
+        self.prevalidate_failure = None
+        try:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prevalidate")
+
+            partnumber_check = self.executor.submit(self.valid_partnumber, serial_number)
+            backcheck = self.executor.submit(self.start_test, serial_number)
+
+            if not partnumber_check.result():
+                backcheck.cancel()
+                self.prevalidate_failure = "partnumber"
+                return False
+            if not backcheck.result():
+                self.prevalidate_failure = "backcheck"
+                return False
+            return True
+
+        except Exception:
+            logger.exception("An exception was raised in the pre-test validation of the serial number.")
+            raise
+
+    def send_result(self, test_result, fail_string, employee, serial_number=None, test_start_time=None,
+                    test_end_time=None, with_reply=False):
         """
         At the end of the test, takes the result and sends the test information to the Traceability system.
 
@@ -195,46 +368,75 @@ class Kimball_Trace:
                 test_result (Int) - The result (0 is "FAIL, 1 is "OK") of the test.
                 failure_string (String) - The response of the test in case of failure.
                 employee (String) - The number employee performing the test.
+                serial_number (String, optional) - The serial number of the unit. Defaults to the last one checked,
+                                                   set it to upload a unit while the next one is being checked.
+                test_start_time (String, optional) - The start time of the unit. Defaults to the one of start_test.
+                test_end_time (String, optional) - The end time of the unit, as written to the logfile. Defaults to
+                                                   the server time now; set it when the upload runs after the unit ended.
+                with_reply (Boolean, optional) - Return the reply of the upload too. replyInsert is shared with
+                                                 the uploads of the next units; set it when uploads overlap them.
 
         Returns:
                 (Boolean) - The result of whether the method was executed successfully. 
+                (Boolean, String) - With with_reply, the result and the reply of this upload.
 
         Exception:
                 An exception arises when there is an issue with inserting a record to the database.
         """       
+        serial_number = serial_number or self.serial_number
+        test_start_time = test_start_time or self.test_start_time
+        sent = False
+        reply = None
         try:
             # The time when test has ended is collected
-            self.test_end_time = self.get_date()
+            test_end_time = self.test_end_time = test_end_time or self.get_date()
             # If the Traceability is deactivated in settings, no actions associated with the system will be executed.
             if not self.is_traceability_enable():
                 logger.debug(f'The traceability system is disabled. InsertProcess not perfomed.')
-                return True
-            
-            # The test result with the details of the test setup is sent to the Traceability system.
-            self.replyInsert = self.connector.InsertProcessDataWithFails(
-                self.serial_number, 
-                self.station_name, 
-                self.process_name,
-                self.test_start_time,
-                self.test_end_time, 
-                test_result, 
-                fail_string, 
-                employee)
-
-            # If the insertion of the record occurs 
-            if "Ok El serial fue insertado" in self.replyInsert or "OK | Insertado Correctamente" in self.replyInsert:
-                logger.debug(f"Serial {self.serial_number}: {self.process_name} was passed successfully.")
-                return True
+                sent = True
+
+            elif self.outbox is not None:
+                payload = {
+                    "serial_number": serial_number,
+                    "station_name": self.station_name,
+                    "process_name": self.process_name,
+                    "test_start_time": test_start_time,
+                    "test_end_time": test_end_time,
+                    "test_result": test_result,
+                    "fail_string": fail_string,
+                    "employee": employee}
+                self.outbox.add("result", f"result|{serial_number}|{test_start_time}", payload)
+                reply = self.replyInsert = "Queued in the traceability outbox"
+                logger.debug(f"Serial {serial_number}: result queued in the outbox.")
+                sent = True
+
             else:
-                raise TraceabilityError(f"An Error ocurred as the traceability failed to upload: {self.replyInsert}")
+                # The test result with the details of the test setup is sent to the Traceability system.
+                reply = self.replyInsert = self.connector.InsertProcessDataWithFails(
+                    serial_number, 
+                    self.station_name, 
+                    self.process_name,
+                    test_start_time,
+                    test_end_time, 
+                    test_result, 
+                    fail_string, 
+                    employee)
+
+                # If the insertion of the record occurs 
+                if "Ok El serial fue insertado" in reply or "OK | Insertado Correctamente" in reply:
+                    logger.debug(f"Serial {serial_number}: {self.process_name} was passed successfully.")
+                    sent = True
+                else:
+                    raise TraceabilityError(f"An Error ocurred as the traceability failed to upload: {reply}")
 
         except TraceabilityError:
             logger.exception("An exception was raised when ending the tests in the Traceability system.")
             raise    
 
-        except (RuntimeError, Exception):
+        except (RuntimeError, Exception) as e:
             logger.exception("An error occurred when indicating ending of tests in the traceability system.")
-            return False
+            reply = reply or f"{e}"
+        return (sent, reply) if with_reply else sent
     
     def send_info_alternate(self, serial_alternate, type_alt, keyname):
         """
@@ -251,13 +453,23 @@ class Kimball_Trace:
         Exceptions:
             An exception is raised if an error occurs during the execution of the method.
         """
-        type_alt = int(get_value_ini(self.case_settings_lst, keyname))
+        type_alt = self.alternate_types[keyname.lower()]
         
         try:
             # If the Traceability is deactivated in settings, no actions associated with the system will be executed.
             if not self.is_traceability_enable():
                 logger.debug(f'The traceability system is disabled. InsertProcess not perfomed.')
                 return True
+            if self.outbox is not None:
+                payload = {
+                    "serial_number": self.serial_number,
+                    "serial_alternate": serial_alternate,
+                    "type_alt": type_alt,
+                    "station_name": self.station_name,
+                    "keyname": keyname}
+                self.outbox.add("alternate", f"alternate|{self.serial_number}|{self.test_start_time}|{type_alt}", payload)
+                return True
+
             reply_insert_alt = self.connector.Insert_SN_Alternate(self.serial_number, serial_alternate, type_alt, self.station_name)
             if not reply_insert_alt == 'OK':
                 raise TraceabilityError(f"An error ocurred as the traceability failed to upload {keyname}: {reply_insert_alt}")
@@ -271,6 +483,153 @@ class Kimball_Trace:
             logger.exception("An error occurred when indicating ending of tests in the traceability system.")
             raise
     
+    def send_info_alternates(self, values):
+        """
+        Sends several alternate identifiers of the DUT to the Traceability system at the same time.
+
+        Parameters:
+            values (dict): The alternate serial numbers by keyname of [INSERT_CODE], e.g. {'imei': '3520...'}.
+
+        Returns:
+            dict: True or False by keyname, whether the identifier was uploaded. The replies
+                  of the failed uploads are kept in replyAlternates.
+
+        Exceptions:
+            KeyError: If a keyname is not in [INSERT_CODE], nothing is uploaded.
+        """
+        self.replyAlternates = {}
+        unknown = [keyname for keyname in values if keyname.lower() not in self.alternate_types]
+        if unknown:
+            raise KeyError(f"Keynames not found in INSERT_CODE: {unknown}")
+        if not values:
+            return {}
+
+        if self.alternate_executor is None:
+            self.alternate_executor = ThreadPoolExecutor(max_workers=self.alternate_workers,
+                                                         thread_name_prefix="alternate")
+        uploads = {keyname: self.alternate_executor.submit(self.send_info_alternate, value, None, keyname)
+                   for keyname, value in values.items()}
+
+        status = {}
+        for keyname, upload in uploads.items():
+            try:
+                status[keyname] = upload.result()
+            except Exception as e:
+                self.replyAlternates[keyname] = str(e)
+                status[keyname] = False
+        logger.debug(f"Serial {self.serial_number}: alternate identifiers uploaded: {status}")
+        return status
+
+    def _deliver_result(self, payload):
+        """
+        Uploads a test result journaled in the outbox.
+
+        Parameters:
+            payload (dict): The arguments of InsertProcessDataWithFails.
+
+        Returns:
+            (Boolean) - True if the record was inserted, or the reply (String) if the traceability system rejected it.
+
+        Exceptions:
+            TraceabilityError: If the traceability system could not be reached, the upload is retried.
+        """
+        reply = self.connector.InsertProcessDataWithFails(
+            payload["serial_number"],
+            payload["station_name"],
+            payload["process_name"],
+            payload["test_start_time"],
+            payload["test_end_time"],
+            payload["test_result"],
+            payload["fail_string"],
+            payload["employee"])
+        if reply in ('', 'One or more errors occurred.'):
+            raise TraceabilityError(f"Connection error to the Traceability system: {reply}")
+        if "Ok El serial fue insertado" in reply or "OK | Insertado Correctamente" in reply:
+            return True
+        logger.error(f"Serial {payload['serial_number']}: the traceability rejected the result: {reply}")
+        return reply
+
+    def _deliver_alternate(self, payload):
+        """
+        Uploads an alternate identifier journaled in the outbox.
+
+        Parameters:
+            payload (dict): The arguments of Insert_SN_Alternate.
+
+        Returns:
+            (Boolean) - True if the record was inserted, or the reply (String) if the traceability system rejected it.
+
+        Exceptions:
+            TraceabilityError: If the traceability system could not be reached, the upload is retried.
+        """
+        reply = self.connector.Insert_SN_Alternate(
+            payload["serial_number"], payload["serial_alternate"], payload["type_alt"], payload["station_name"])
+        if reply in ('', 'One or more errors occurred.'):
+            raise TraceabilityError(f"Connection error to the Traceability system: {reply}")
+        if reply == 'OK':
+            return True
+        logger.error(f"Serial {payload['serial_number']}: the traceability rejected {payload['keyname']}: {reply}")
+        return reply
+
+    def take_rejections(self):
+        """
+        Gets the uploads of the outbox rejected by the traceability system since the last call,
+        so the operator is told before the next unit.
+
+        Returns:
+            list: A message (String) per rejected upload, empty without the outbox.
+        """
+        if getattr(self, "outbox", None) is None:
+            return []
+        return [f"{record['payload'].get('serial_number')} ({record['kind']} #{record['id']}): {record['reply']}"
+                for record in self.outbox.take_rejections()]
+
+    def trace_stats(self):
+        """
+        Gets the latency percentiles and failures of every connector method, and the circuit state.
+
+        Returns:
+            dict: The stats, empty if the traceability system is disabled.
+        """
+        connector = getattr(self, "_connector", None)
+        return connector.stats() if isinstance(connector, InstrumentedConnector) else {}
+
+    def export_trace_stats(self, path=None):
+        """
+        Writes the connector stats to a JSON file.
+
+        Parameters:
+            path (str, optional): The output path. Defaults to app_log/trace_stats.json.
+
+        Returns:
+            str: The path written, None if the traceability system is disabled.
+        """
+        connector = getattr(self, "_connector", None)
+        if not isinstance(connector, InstrumentedConnector):
+            return None
+        return connector.export(path or os.path.join(log_path, "trace_stats.json"))
+
+    def close(self):
+        """
+        Stops the background work of the traceability system; pending uploads stay journaled
+        and the connector stats are written to app_log/trace_stats.json.
+
+        Returns:
+            None
+        """
+        if getattr(self, "outbox", None) is not None:
+            self.outbox.close()
+        for instance in [self] + getattr(self, "contexts", []):
+            for executor in (getattr(instance, "executor", None), getattr(instance, "alternate_executor", None)):
+                if executor is not None:
+                    executor.shutdown(wait=False, cancel_futures=True)
+        if hasattr(self, "partnumber_cache"):
+            logger.debug(f"Part number cache: {self.partnumber_cache.stats()}")
+        stats = self.trace_stats()
+        if stats:
+            logger.debug(f"Connector stats: {stats}")
+            self.export_trace_stats()
+
     def is_traceability_enable(self):
         '''
         The indicator for the traceability system indicates whether the system is enable or disabled.
@@ -310,11 +669,19 @@ class Kimball_Trace:
         """
         Gets the current datetime from the traceability system or the local system.
 
+        The traceability system time is synced once and then served from the local
+        monotonic clock until the resync interval passes or the drift exceeds its threshold.
+
         Returns:
             str: The current datetime.
         """
         if self.is_traceability_enable():
-            str_date = self.connector.CIMP_GetDateTimeStr()
+            try:
+                str_date = self.clock.now()
+            except TraceabilityError:
+                # The circuit is open, the local time is used in the server format until it recovers.
+                logger.debug("The traceability server is unavailable, using the local time.")
+                str_date = datetime.now().strftime(self.clock.format or "%Y-%m-%d %H:%M:%S")
         else:
             str_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
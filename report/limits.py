@@ -0,0 +1,282 @@
+"""
+This module keeps the test limits of testnames.txt parsed in memory
+"""
+
+import os
+import logging
+from collections import namedtuple
+from pathlib import Path
+
+logger = logging.getLogger("DUT_logger")
+
+# Paths to folders relative to this py file.
+local_path = os.path.dirname(os.path.abspath(__file__))
+parent_path = Path(local_path).parent.absolute()
+
+testname_fname = "testnames.txt"
+testname_path = os.path.join(parent_path, 'settings', testname_fname)
+
+# Number of info columns in a logfile row before the first test result
+# (Date, PartNumber, StartTime, EndTime, TraceEnable, TestResult, SerialNumber).
+INFO_COLUMNS = 7
+
+# Limit values that mean the field is not used.
+EMPTY_LIMITS = ("NA", "TBD", "")
+
+# Result of LimitEngine.evaluate: verdicts maps testname to True (pass), False (fail)
+# or None (not evaluated), failing_step is the first testname that failed.
+Evaluation = namedtuple("Evaluation", ["verdicts", "passed", "failing_step"])
+
+
+class LimitTable:
+    def __init__(self, path=testname_path):
+        """
+        Initialize the limit table and parse the testname file.
+
+        Args:
+            path (str, optional): The path to the testname file. Defaults to settings/testnames.txt.
+
+        Returns:
+            None
+        """
+        self.path = path
+        self.mtime = None
+        self.testnames = []
+        self.low_limits = []
+        self.high_limits = []
+        self.expected_values = []
+        self.units = []
+        self.logic_operators = []
+        self.column_index = {}
+        self.reload()
+
+    def reload(self):
+        """
+        Parses the testname file again only if its mtime changed since the last load.
+
+        Returns:
+            bool: True if the file was parsed, False if the cached table is still valid.
+        """
+        try:
+            mtime = os.path.getmtime(self.path)
+            if mtime == self.mtime:
+                return False
+
+            with open(self.path, 'r') as file:
+                rows = [line.strip().split(',') for line in file if line.strip()]
+
+            # The first row of the file holds the column titles, keep it as is
+            # so the logfile header is identical to the one built before.
+            self.testnames = [row[0] for row in rows]
+            self.low_limits = [row[1] for row in rows]
+            self.high_limits = [row[2] for row in rows]
+            self.expected_values = [row[3] for row in rows]
+            self.units = [row[4] for row in rows]
+            self.logic_operators = [row[5] for row in rows]
+
+            # Logfile rows have the info columns first and the tests after them,
+            # the title row of the file lines up with the last info column.
+            self.column_index = {
+                name: INFO_COLUMNS - 1 + i for i, name in enumerate(self.testnames) if i > 0}
+            self.mtime = mtime
+            logger.debug(f"Limit table loaded: {len(self.column_index)} tests from {self.path}")
+            return True
+        except Exception as e:
+            logger.exception(f"Error loading limit table: {e}")
+            return False
+
+    @property
+    def test_count(self):
+        """
+        Number of tests declared in the testname file.
+
+        Returns:
+            int: The number of tests, the title row is not counted.
+        """
+        return len(self.column_index)
+
+    def columns(self):
+        """
+        Retrieves the parsed columns of the testname file.
+
+        Returns:
+            list: A list containing testnames, low_limits, high_limits,
+                  expected_values, units, and logic_operators.
+        """
+        return [
+            self.testnames,
+            self.low_limits,
+            self.high_limits,
+            self.expected_values,
+            self.units,
+            self.logic_operators]
+
+    def header(self):
+        """
+        Builds the limits header written on top of every logfile.
+
+        Returns:
+            list: Six rows, each one starts with six blanks followed by a column of the testname file.
+        """
+        blanks = [""] * (INFO_COLUMNS - 1)
+        return [blanks + column for column in self.columns()]
+
+    def get_limits(self, testname):
+        """
+        Retrieves the limits declared for a testname.
+
+        Args:
+            testname (str): The testname to search for.
+
+        Returns:
+            dict: The low_limit, high_limit, expected_value, unit and logic_operator of the test.
+                  None if the testname is unknown.
+        """
+        column = self.column_index.get(testname)
+        if column is None:
+            return None
+        i = column - INFO_COLUMNS + 1
+        return {
+            "low_limit": self.low_limits[i],
+            "high_limit": self.high_limits[i],
+            "expected_value": self.expected_values[i],
+            "unit": self.units[i],
+            "logic_operator": self.logic_operators[i]}
+
+
+def _to_float(value):
+    """
+    Converts a measurement or limit to float.
+
+    Args:
+        value (str): The value to convert.
+
+    Returns:
+        float: The value, None if it is not numeric.
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class Limit:
+    def __init__(self, testname, low_limit, high_limit, expected_value, unit, logic_operator):
+        """
+        Compiles a row of the testname file into a predicate.
+
+        Operators:
+            ==  The measurement equals the expected value (the low limit if there is no expected value).
+            ><  The measurement is a number between the low and high limits, both included.
+            ||  The measurement equals the low or the high limit.
+            NA, TBD  Not evaluated, the test is informational or not defined yet.
+
+        Args:
+            testname (str): The name of the test.
+            low_limit (str): The low limit.
+            high_limit (str): The high limit.
+            expected_value (str): The expected value.
+            unit (str): The unit of the measurement.
+            logic_operator (str): The operator of the test.
+
+        Returns:
+            None
+        """
+        self.testname = testname
+        self.unit = unit
+        self.logic_operator = logic_operator
+        self.check = None
+
+        if logic_operator == "==":
+            expected = expected_value if expected_value not in EMPTY_LIMITS else low_limit
+            expected_number = _to_float(expected)
+            if expected_number is not None:
+                self.check = lambda value: value == expected or _to_float(value) == expected_number
+            else:
+                self.check = lambda value: value == expected
+        elif logic_operator == "><":
+            low, high = _to_float(low_limit), _to_float(high_limit)
+            if low is not None and high is not None:
+                self.check = lambda value: (_to_float(value) is not None and low <= _to_float(value) <= high)
+        elif logic_operator == "||":
+            allowed = {value for value in (low_limit, high_limit) if value not in EMPTY_LIMITS}
+            self.check = lambda value: value in allowed
+
+        if self.check is None and logic_operator not in EMPTY_LIMITS:
+            logger.warning(f"Limit of {testname} is not evaluated, unknown operator or limits: {logic_operator}")
+
+    def __call__(self, measurement):
+        """
+        Evaluates a measurement.
+
+        Args:
+            measurement (str): The measurement, "" if the test did not run.
+
+        Returns:
+            bool: True if it passes, False if it fails, None if it is not evaluated.
+        """
+        if self.check is None or measurement is None or str(measurement) == "":
+            return None
+        return bool(self.check(str(measurement)))
+
+
+class LimitEngine:
+    def __init__(self, limits):
+        """
+        Initialize the engine over a limit table; predicates are compiled again only when the table reloads.
+
+        Args:
+            limits (LimitTable): The parsed testname file.
+
+        Returns:
+            None
+        """
+        self.limits = limits
+        self.compiled_mtime = None
+        self.predicates = []
+        self.by_name = {}
+        self.compile()
+
+    def compile(self):
+        """
+        Compiles every row of the limit table into a Limit predicate if the table changed.
+
+        Returns:
+            None
+        """
+        self.limits.reload()
+        if self.compiled_mtime == self.limits.mtime:
+            return
+        rows = zip(*[column[1:] for column in self.limits.columns()])
+        self.predicates = [Limit(*row) for row in rows]
+        self.by_name = {predicate.testname: predicate for predicate in self.predicates}
+        self.compiled_mtime = self.limits.mtime
+
+    def evaluate(self, measurements, start=0):
+        """
+        Evaluates a vector of measurements against all the limits in one call.
+
+        Args:
+            measurements (list or dict): Values in testname file order, as the results of a
+                logfile row, or a dict of values by testname.
+            start (int, optional): The index of the test of the first value of a list, to evaluate
+                the values of a single step. Defaults to 0.
+
+        Returns:
+            Evaluation: The verdict per testname, the overall result and the first step that failed.
+        """
+        self.compile()
+        if isinstance(measurements, dict):
+            pairs = [(self.by_name.get(name), name, value) for name, value in measurements.items()]
+        else:
+            pairs = [(predicate, predicate.testname, value)
+                     for predicate, value in zip(self.predicates[start:], measurements)]
+
+        verdicts = {}
+        failing_step = None
+        for predicate, name, value in pairs:
+            verdict = predicate(value) if predicate is not None else None
+            verdicts[name] = verdict
+            if verdict is False and failing_step is None:
+                failing_step = name
+        return Evaluation(verdicts, failing_step is None, failing_step)
@@ -0,0 +1,79 @@
+"""
+This module provides advisory file locks shared by the stations writing the logfiles
+"""
+
+import logging
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+    import fcntl
+
+logger = logging.getLogger("DUT_logger")
+
+LOCK_SUFFIX = ".lock"
+
+
+class FileLock:
+    def __init__(self, path):
+        """
+        Initialize an advisory lock held on a sidecar '<path>.lock' file.
+
+        The lock lives in its own file so readers of the logfile are never
+        blocked, even with the mandatory byte-range locks of Windows.
+
+        Args:
+            path (str): The path of the file to protect.
+
+        Returns:
+            None
+        """
+        self.path = path + LOCK_SUFFIX
+        self.file = None
+
+    def acquire(self):
+        """
+        Blocks until the lock is held.
+
+        Returns:
+            None
+        """
+        self.file = open(self.path, mode='a+')
+        if msvcrt is not None:
+            self.file.seek(0)
+            # LK_LOCK retries for 10 seconds before raising, keep waiting like flock does.
+            while True:
+                try:
+                    msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    logger.debug(f"Waiting for lock: {self.path}")
+        else:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+
+    def release(self):
+        """
+        Releases the lock.
+
+        Returns:
+            None
+        """
+        if self.file is None:
+            return
+        try:
+            if msvcrt is not None:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
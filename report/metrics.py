@@ -0,0 +1,265 @@
+"""
+This module times the Traceability connector calls and stops calling a server that is down
+"""
+
+import math
+import json
+import time
+import logging
+from threading import Lock
+from exceptions import TraceabilityError
+
+logger = logging.getLogger("traceability_logger")
+
+# Replies of the WSConnector when the server could not be reached.
+error_replies = ("", "One or more errors occurred.")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class LatencyHistogram:
+    # Every bucket is about 4.4% wider than the previous one, the error of the percentiles.
+    base = 2 ** (1 / 16)
+
+    def __init__(self):
+        """
+        Initialize an empty histogram of latencies in seconds with logarithmic buckets.
+
+        Returns:
+            None
+        """
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.lock = Lock()
+
+    def add(self, seconds):
+        """
+        Records a latency.
+
+        Args:
+            seconds (float): The latency.
+
+        Returns:
+            None
+        """
+        bucket = math.floor(math.log(max(seconds, 1e-9), self.base))
+        with self.lock:
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+            self.count += 1
+            self.total += seconds
+            self.min = seconds if self.min is None else min(self.min, seconds)
+            self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def percentile(self, q):
+        """
+        Estimates a percentile from the buckets.
+
+        Args:
+            q (float): The percentile between 0 and 1.
+
+        Returns:
+            float: The latency in seconds, None if the histogram is empty.
+        """
+        with self.lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            seen = 0
+            for bucket in sorted(self.buckets):
+                seen += self.buckets[bucket]
+                if seen >= rank:
+                    # The middle of the bucket, clamped to the latencies seen.
+                    value = self.base ** (bucket + 0.5)
+                    return min(max(value, self.min), self.max)
+            return self.max
+
+    def summary(self):
+        """
+        Summarizes the histogram.
+
+        Returns:
+            dict: calls, mean, p50/p95/p99 and max in milliseconds.
+        """
+        def ms(seconds):
+            return None if seconds is None else seconds * 1000
+
+        return {"calls": self.count,
+                "mean_ms": ms(self.total / self.count) if self.count else None,
+                "p50_ms": ms(self.percentile(0.50)),
+                "p95_ms": ms(self.percentile(0.95)),
+                "p99_ms": ms(self.percentile(0.99)),
+                "max_ms": ms(self.max)}
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_seconds=30):
+        """
+        Initialize a closed circuit breaker.
+
+        After failure_threshold consecutive failures the circuit opens and calls fail at
+        once. When reset_seconds pass, one probe call is let through (half open): success
+        closes the circuit, failure opens it again.
+
+        Args:
+            failure_threshold (int, optional): Consecutive failures to open the circuit. Defaults to 5.
+            reset_seconds (float, optional): Seconds open before probing the server. Defaults to 30.
+
+        Returns:
+            None
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.rejected = 0
+        self.lock = Lock()
+
+    def allow(self):
+        """
+        Checks if a call may be made.
+
+        Returns:
+            bool: True if the circuit is closed or this call is the half open probe.
+        """
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = HALF_OPEN
+                logger.debug("Traceability circuit half open, probing the server.")
+            if self.state == HALF_OPEN and not self.probing:
+                self.probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, success):
+        """
+        Records the outcome of an allowed call.
+
+        Args:
+            success (bool): Whether the server answered correctly.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.probing = False
+            if success:
+                if self.state != CLOSED:
+                    logger.debug("Traceability circuit closed, the server answered.")
+                self.state = CLOSED
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.error(f"Traceability circuit open after {self.failures} failures, "
+                                 f"calls fail at once for {self.reset_seconds} s.")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+
+class InstrumentedConnector:
+    def __init__(self, connector, breaker=None, timeout=None):
+        """
+        Wraps a WSConnector: every call is timed into a histogram by method and guarded by a circuit breaker.
+
+        A call fails when it raises, replies a connection error or lasts more than timeout.
+
+        Args:
+            connector (object): The WSConnector or a stand-in with the same methods.
+            breaker (CircuitBreaker, optional): Defaults to a breaker with the default settings.
+            timeout (float, optional): Seconds after which a call counts as a failure. Defaults to None.
+
+        Returns:
+            None
+        """
+        self.connector = connector
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.timeout = timeout
+        self.histograms = {}
+        self.failures = {}
+
+    def __getattr__(self, name):
+        attribute = getattr(self.connector, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args):
+            if not self.breaker.allow():
+                raise TraceabilityError(f"The traceability circuit is open, {name} was not called.")
+            start = time.perf_counter()
+            try:
+                reply = attribute(*args)
+            except Exception:
+                self._record(name, time.perf_counter() - start, False)
+                raise
+            self._record(name, time.perf_counter() - start, not self._is_error(reply))
+            return reply
+        return call
+
+    def _is_error(self, reply):
+        """
+        Checks if a reply is a connection error of the WSConnector.
+
+        Args:
+            reply: The reply, the first item is checked for calls with out parameters.
+
+        Returns:
+            bool: True on a connection error reply.
+        """
+        if isinstance(reply, tuple):
+            reply = reply[0]
+        return reply is None or str(reply) in error_replies or str(reply).endswith("|" + error_replies[1])
+
+    def _record(self, name, seconds, success):
+        """
+        Stores the latency of a call and its outcome in the circuit breaker.
+
+        Returns:
+            None
+        """
+        if success and self.timeout is not None and seconds > self.timeout:
+            logger.error(f"Traceability {name} took {seconds:.1f} s, more than {self.timeout} s.")
+            success = False
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms.setdefault(name, LatencyHistogram())
+        histogram.add(seconds)
+        if not success:
+            self.failures[name] = self.failures.get(name, 0) + 1
+        self.breaker.record(success)
+
+    def stats(self):
+        """
+        Gets the latency summary and failures of every method called.
+
+        Returns:
+            dict: The histogram summary by method, with its failures, and the circuit state.
+        """
+        methods = {name: dict(histogram.summary(), failures=self.failures.get(name, 0))
+                   for name, histogram in list(self.histograms.items())}
+        return {"methods": methods,
+                "circuit": {"state": self.breaker.state, "rejected": self.breaker.rejected}}
+
+    def export(self, path):
+        """
+        Writes the stats to a JSON file.
+
+        Args:
+            path (str): The output path.
+
+        Returns:
+            str: The path written.
+        """
+        with open(path, "w") as file:
+            json.dump(self.stats(), file, indent=2)
+        return path
@@ -0,0 +1,301 @@
+"""
+This module keeps a durable store-and-forward outbox for the Traceability uploads
+"""
+
+import os
+import sys
+import json
+import argparse
+import sqlite3
+import logging
+from datetime import datetime
+from threading import Thread, Event, Lock
+
+logger = logging.getLogger("traceability_logger")
+
+# Paths to folders relative to this py file.
+local_path = os.path.dirname(os.path.abspath(__file__))
+outbox_path = os.path.join(local_path, 'outbox.db')
+
+PENDING = "pending"
+SENT = "sent"
+REJECTED = "rejected"
+
+_schema = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    dedup_key TEXT NOT NULL UNIQUE,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created TEXT NOT NULL,
+    reply TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_records_status ON records(status, id);
+"""
+
+
+class TraceOutbox:
+    def __init__(self, handlers, path=outbox_path, base_backoff=1.0, max_backoff=300.0):
+        """
+        Initialize the outbox journal and start the background drainer.
+
+        Records are delivered one at a time in the order they were added; a record
+        failing with a connection error is retried with exponential backoff and
+        holds back the records after it. Records rejected by the server are kept for
+        take_rejections(), and can be listed and replayed.
+
+        Args:
+            handlers (dict): Delivery callable by record kind. It receives the payload dict and
+                returns True when delivered, or False or the server reply when the server rejects
+                it, and raises on errors worth a retry.
+            path (str, optional): The path to the journal database. Defaults to report/outbox.db.
+            base_backoff (float, optional): Seconds before the first retry. Defaults to 1.0.
+            max_backoff (float, optional): Maximum seconds between retries. Defaults to 300.0.
+
+        Returns:
+            None
+        """
+        self.handlers = handlers
+        self.path = path
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lock = Lock()
+        self.wake = Event()
+        self.stopping = Event()
+        # Rejected records not shown to the operator yet.
+        self.rejections = []
+
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=FULL")
+        self.connection.executescript(_schema)
+
+        self.thread = Thread(target=self._drain, name="TraceOutbox", daemon=True)
+        self.thread.start()
+        logger.debug(f"Traceability outbox started, pending records: {self.pending_count()}")
+
+    def add(self, kind, dedup_key, payload):
+        """
+        Writes a record to the journal; it is committed to disk before returning.
+
+        Args:
+            kind (str): The record kind, a key of the handlers.
+            dedup_key (str): Identifies the upload; a record with a known key is ignored.
+            payload (dict): The JSON serializable arguments of the upload.
+
+        Returns:
+            bool: True if the record was added, False if it was a duplicate.
+        """
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                "INSERT OR IGNORE INTO records (kind, dedup_key, payload, status, created) VALUES (?, ?, ?, ?, ?)",
+                (kind, dedup_key, json.dumps(payload), PENDING, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        added = cursor.rowcount == 1
+        if added:
+            self.wake.set()
+        else:
+            logger.debug(f"Outbox record already journaled: {dedup_key}")
+        return added
+
+    def pending_count(self):
+        """
+        Counts the records not delivered yet.
+
+        Returns:
+            int: The number of pending records.
+        """
+        with self.lock:
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM records WHERE status = ?", (PENDING,)).fetchone()[0]
+
+    def take_rejections(self):
+        """
+        Gets the records rejected since the last call, to show them to the operator.
+
+        Returns:
+            list: The rejected records, as dicts.
+        """
+        with self.lock:
+            rejections = self.rejections
+            self.rejections = []
+        return rejections
+
+    def rejected(self):
+        """
+        Lists every rejected record of the journal.
+
+        Returns:
+            list: The rejected records, as dicts, oldest first.
+        """
+        with self.lock:
+            return list_rejected(self.connection)
+
+    def replay(self, record_id):
+        """
+        Queues a rejected record to be delivered again, e.g. once its route is fixed.
+
+        Args:
+            record_id (int): The id of the record.
+
+        Returns:
+            bool: True if the record was queued, False if it is not a rejected record.
+        """
+        with self.lock:
+            replayed = replay_record(self.connection, record_id)
+        if replayed:
+            self.wake.set()
+        return replayed
+
+    def _next(self):
+        """
+        Gets the oldest pending record.
+
+        Returns:
+            sqlite3.Row: The record, None if there is none.
+        """
+        with self.lock:
+            return self.connection.execute(
+                "SELECT * FROM records WHERE status = ? ORDER BY id LIMIT 1", (PENDING,)).fetchone()
+
+    def _update(self, record_id, status, attempts, reply):
+        """
+        Stores the outcome of a delivery attempt.
+
+        Returns:
+            None
+        """
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE records SET status = ?, attempts = ?, reply = ? WHERE id = ?",
+                (status, attempts, reply, record_id))
+
+    def _drain(self):
+        """
+        Background loop: delivers the pending records in order, backing off on errors.
+
+        Returns:
+            None
+        """
+        while not self.stopping.is_set():
+            record = self._next()
+            if record is None:
+                # Records replayed by another process are picked up on the next check.
+                self.wake.wait(60)
+                self.wake.clear()
+                continue
+
+            attempts = record["attempts"] + 1
+            try:
+                delivered = self.handlers[record["kind"]](json.loads(record["payload"]))
+            except Exception as e:
+                backoff = min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1))
+                logger.error(f"Outbox delivery of {record['dedup_key']} failed (attempt {attempts}), "
+                             f"retry in {backoff:.0f} s: {e}")
+                self._update(record["id"], PENDING, attempts, str(e))
+                self.stopping.wait(backoff)
+                continue
+
+            if delivered is True:
+                self._update(record["id"], SENT, attempts, None)
+                logger.debug(f"Outbox record delivered: {record['dedup_key']}")
+            else:
+                reply = delivered or "Rejected by the traceability system"
+                self._update(record["id"], REJECTED, attempts, reply)
+                logger.error(f"Outbox record rejected by the traceability system: {record['dedup_key']}: {reply}")
+                rejection = dict(record)
+                rejection.update(status=REJECTED, attempts=attempts, reply=reply,
+                                 payload=json.loads(record["payload"]))
+                with self.lock:
+                    self.rejections.append(rejection)
+
+    def close(self, timeout=10):
+        """
+        Stops the drainer; pending records stay in the journal for the next start.
+
+        Args:
+            timeout (float, optional): Seconds to wait for a delivery in progress. Defaults to 10.
+
+        Returns:
+            None
+        """
+        self.stopping.set()
+        self.wake.set()
+        self.thread.join(timeout)
+        if not self.thread.is_alive():
+            with self.lock:
+                self.connection.close()
+        logger.debug("Traceability outbox closed.")
+
+
+def list_rejected(connection):
+    """
+    Lists the rejected records of a journal.
+
+    Args:
+        connection (sqlite3.Connection): The journal database, with sqlite3.Row rows.
+
+    Returns:
+        list: The rejected records, as dicts, oldest first.
+    """
+    records = []
+    for row in connection.execute("SELECT * FROM records WHERE status = ? ORDER BY id", (REJECTED,)):
+        record = dict(row)
+        record["payload"] = json.loads(record["payload"])
+        records.append(record)
+    return records
+
+
+def replay_record(connection, record_id):
+    """
+    Sets a rejected record of a journal pending again.
+
+    Args:
+        connection (sqlite3.Connection): The journal database.
+        record_id (int): The id of the record.
+
+    Returns:
+        bool: True if the record was set pending, False if it is not a rejected record.
+    """
+    with connection:
+        cursor = connection.execute(
+            "UPDATE records SET status = ?, attempts = 0 WHERE id = ? AND status = ?", (PENDING, record_id, REJECTED))
+    if cursor.rowcount == 1:
+        logger.debug(f"Outbox record {record_id} queued again.")
+    return cursor.rowcount == 1
+
+
+def main(argv=None):
+    """
+    Lists or replays the rejected records of the outbox, e.g. python -m report.outbox replay 12.
+    A running station delivers the replayed records within a minute.
+
+    Returns:
+        int: The exit code.
+    """
+    parser = argparse.ArgumentParser(description="Rejected records of the traceability outbox.")
+    parser.add_argument("command", choices=("list", "replay"))
+    parser.add_argument("ids", nargs="*", type=int, help="The records to replay.")
+    parser.add_argument("--path", default=outbox_path, help="The outbox journal.")
+    args = parser.parse_args(argv)
+
+    connection = sqlite3.connect(args.path)
+    connection.row_factory = sqlite3.Row
+    try:
+        if args.command == "list":
+            for record in list_rejected(connection):
+                print(f"{record['id']}\t{record['created']}\t{record['kind']}\t"
+                      f"{record['payload'].get('serial_number')}\t{record['reply']}")
+            return 0
+        failed = [record_id for record_id in args.ids if not replay_record(connection, record_id)]
+        if failed:
+            print(f"Not rejected records: {failed}")
+        return 1 if failed else 0
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,303 @@
+"""
+This module streams the DUTs history across the daily logfiles
+"""
+
+import os
+import re
+import csv
+import gzip
+import heapq
+import logging
+from collections import namedtuple
+from datetime import datetime
+from report.report import logfiles_dir
+from report.limits import INFO_COLUMNS
+
+logger = logging.getLogger("DUT_logger")
+
+# Rows before the first data row: six limit rows and the info column names.
+HEADER_ROWS = 7
+
+# Live logfiles, station segments (CCAR_EOL_<date>.<station>.csv) and the gzip archives of past days.
+logfile_pattern = re.compile(r"^CCAR_EOL_(\d{2}-\d{2}-\d{4})(?:\.([\w-]+))?\.csv(\.gz)?$")
+
+LogRow = namedtuple("LogRow", ["Date", "PartNumber", "StartTime", "EndTime", "TraceEnable",
+                               "TestResult", "SerialNumber", "results", "Station"], defaults=[None])
+LogRow.__doc__ = """
+A typed logfile row.
+
+Date is the datetime the row was written, StartTime and EndTime are datetimes (None if empty),
+TraceEnable and TestResult are booleans (None if unrecognized), results maps testname to value
+and Station is the station of the segment the row was read from (None for a shared logfile).
+"""
+
+
+def to_bool(value):
+    """
+    Converts a logfile 'True'/'False' value to bool.
+
+    Args:
+        value (str): The value read from the logfile.
+
+    Returns:
+        bool: The value, None if it is not 'True' or 'False'.
+    """
+    if value == "True":
+        return True
+    if value == "False":
+        return False
+    return None
+
+
+def to_datetime(value):
+    """
+    Converts a logfile 'YYYY-MM-DD HH:MM:SS' value to datetime.
+
+    Args:
+        value (str): The value read from the logfile.
+
+    Returns:
+        datetime: The value, None if it is empty or malformed.
+    """
+    try:
+        return datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        return None
+
+
+class DayFile:
+    def __init__(self, day, path, station=None):
+        """
+        Initialize the index entry of a daily logfile.
+
+        Args:
+            day (datetime.date): The day of the logfile.
+            path (str): The path to the logfile.
+            station (str, optional): The station of a segment file. Defaults to None (shared logfile).
+
+        Returns:
+            None
+        """
+        self.day = day
+        self.path = path
+        self.station = station
+        self.compressed = path.endswith(".gz")
+        self.testnames = []
+        self.data_offset = None
+        # Size of the file on disk and length of the data indexed, decompressed for archives.
+        self.size = 0
+        self.length = 0
+        self.rows = 0
+
+    def open(self):
+        """
+        Opens the logfile for binary reading, decompressing it on the fly if it is archived.
+
+        Returns:
+            file: The binary file object.
+        """
+        if self.compressed:
+            return gzip.open(self.path, mode='rb')
+        return open(self.path, mode='rb')
+
+    def update(self):
+        """
+        Reads the header and counts the data rows added since the last update.
+
+        Only the bytes appended since the previous update are read, so the
+        live day file is cheap to keep up to date. Archives never change and
+        are read once.
+
+        Returns:
+            None
+        """
+        size = os.path.getsize(self.path)
+        if size == self.size:
+            return
+        with self.open() as file:
+            if self.compressed or self.data_offset is None or size < self.size:
+                names = file.readline().decode(errors="replace").rstrip("\r\n").split(',')
+                self.testnames = names[INFO_COLUMNS:]
+                for _ in range(HEADER_ROWS - 1):
+                    file.readline()
+                self.data_offset = file.tell()
+                self.length = self.data_offset
+                self.rows = 0
+            file.seek(self.length)
+            for line in file:
+                if not line.endswith(b"\n"):
+                    # Row still being written, count it on the next update.
+                    break
+                self.length += len(line)
+                if line.strip():
+                    self.rows += 1
+        self.size = size
+
+
+class HistoryReader:
+    def __init__(self, directory=logfiles_dir):
+        """
+        Initialize the reader and index the daily logfiles of a directory.
+
+        Args:
+            directory (str, optional): The logfiles folder. Defaults to report/logfiles.
+
+        Returns:
+            None
+        """
+        self.directory = directory
+        self.files = {}
+        self.refresh()
+
+    def refresh(self):
+        """
+        Updates the index with the logfiles added, grown or removed from the directory.
+
+        Entries are keyed by (day, station), the station is "" for the shared logfile.
+
+        Returns:
+            None
+        """
+        try:
+            found = {}
+            for name in sorted(os.listdir(self.directory)):
+                match = logfile_pattern.match(name)
+                if not match:
+                    continue
+                day = datetime.strptime(match.group(1), "%m-%d-%Y").date()
+                key = (day, match.group(2) or "")
+                path = os.path.join(self.directory, name)
+                # While a day is being archived both files exist, the live one is complete.
+                if key in found and match.group(3):
+                    continue
+                known = self.files.get(key)
+                found[key] = known if known is not None and known.path == path else DayFile(day, path, match.group(2))
+            for entry in found.values():
+                entry.update()
+            self.files = dict(sorted(found.items()))
+        except Exception as e:
+            logger.exception(f"Error indexing logfiles: {e}")
+
+    def days(self, date_from=None, date_to=None):
+        """
+        Retrieves the indexed days inside a date range.
+
+        Args:
+            date_from (datetime.date, optional): First day included. Defaults to None (oldest).
+            date_to (datetime.date, optional): Last day included. Defaults to None (newest).
+
+        Returns:
+            list: The DayFile entries sorted by day, one per station segment.
+        """
+        return [entry for (day, _), entry in self.files.items()
+                if (date_from is None or day >= date_from) and (date_to is None or day <= date_to)]
+
+    def row_count(self, date_from=None, date_to=None):
+        """
+        Counts the data rows inside a date range from the index, without reading the files.
+
+        Args:
+            date_from (datetime.date, optional): First day included. Defaults to None (oldest).
+            date_to (datetime.date, optional): Last day included. Defaults to None (newest).
+
+        Returns:
+            int: The number of data rows.
+        """
+        return sum(entry.rows for entry in self.days(date_from, date_to))
+
+    def read(self, date_from=None, date_to=None, serial=None):
+        """
+        Yields the typed rows of a date range, one row at a time.
+
+        The station segments of a day are merged lazily by the time the rows were written.
+
+        Args:
+            date_from (datetime.date, optional): First day included. Defaults to None (oldest).
+            date_to (datetime.date, optional): Last day included. Defaults to None (newest).
+            serial (str, optional): Only rows of this serial number. Defaults to None (any).
+
+        Yields:
+            LogRow: The rows in the order they were written.
+        """
+        self.refresh()
+        segments = {}
+        for entry in self.days(date_from, date_to):
+            segments.setdefault(entry.day, []).append(entry)
+        for entries in segments.values():
+            streams = [self._read_segment(entry, serial) for entry in entries]
+            rows = streams[0] if len(streams) == 1 else heapq.merge(*streams, key=lambda row: row[0])
+            for _, entry, row in rows:
+                yield self._to_logrow(entry, row)
+
+    def _read_segment(self, entry, serial):
+        """
+        Yields the rows of a segment matching a serial, keyed by their Date column for merging.
+
+        Args:
+            entry (DayFile): The index entry of the logfile.
+            serial (str): Only rows of this serial number, None for any.
+
+        Yields:
+            tuple: (Date column, entry, raw row).
+        """
+        for row in self._read_file(entry):
+            if serial is not None and row[INFO_COLUMNS - 1] != str(serial):
+                continue
+            yield row[0], entry, row
+
+    def _read_file(self, entry):
+        """
+        Yields the raw data rows of a logfile up to the indexed size, skipping its header.
+
+        Args:
+            entry (DayFile): The index entry of the logfile.
+
+        Yields:
+            list: The raw CSV rows.
+        """
+        try:
+            with entry.open() as file:
+                file.seek(entry.data_offset)
+                for row in csv.reader(self._lines(file, entry.length - entry.data_offset)):
+                    if row:
+                        yield row
+        except Exception as e:
+            logger.exception(f"Error reading logfile {entry.path}: {e}")
+
+    def _lines(self, file, length):
+        """
+        Yields decoded lines of a file until a number of bytes was read.
+
+        Args:
+            file (io.BufferedReader): The file, positioned where reading starts.
+            length (int): The number of bytes to read.
+
+        Yields:
+            str: The lines read.
+        """
+        for line in file:
+            if length <= 0:
+                return
+            length -= len(line)
+            yield line.decode(errors="replace")
+
+    def _to_logrow(self, entry, row):
+        """
+        Converts a raw CSV row to a typed LogRow.
+
+        Args:
+            entry (DayFile): The index entry of the logfile the row belongs to.
+            row (list): The raw CSV row.
+
+        Returns:
+            LogRow: The typed row.
+        """
+        try:
+            written = datetime.combine(entry.day, datetime.strptime(row[0], "%H:%M:%S").time())
+        except ValueError:
+            written = None
+        results = {name: value for name, value in zip(entry.testnames, row[INFO_COLUMNS:])
+                   if name and value != ""}
+        return LogRow(written, row[1], to_datetime(row[2]), to_datetime(row[3]),
+                      to_bool(row[4]), to_bool(row[5]), row[6], results, entry.station)
+
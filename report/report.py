@@ -4,9 +4,17 @@ This module is for perform daily logfiles of DUTs
 
 import os
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
+import re
 import csv
+import atexit
+from contextlib import nullcontext
+from threading import Thread
 import logger as log
+from report.limits import LimitTable, LimitEngine, INFO_COLUMNS
+from report.writer import LogWriter, FSYNC_SHUTDOWN
+from report.archive import archive_closed_days
+from report.locking import FileLock
 
 # Paths to folders relative to this py file.
 local_path = os.path.dirname(os.path.abspath(__file__))
@@ -29,19 +37,70 @@ testname_fname = "testnames.txt"
 testname_path = os.path.join(parent_path, 'settings', testname_fname)
 logfiles_dir = os.path.join(local_path, 'logfiles')
 
+STEPS_HEADER = ["Date", "SerialNumber", "StartTime", "Step", "Duration", "Measurement", "Verdict", "Error", "Position"]
+
 class History:
-    def __init__(self):
+    def __init__(self, writer_mode="direct", fsync_policy=FSYNC_SHUTDOWN, fsync_rows=10,
+                 flush_rows=10, flush_seconds=1.0, archive=False, station=None):
         """
         Initialize the History class and create a log file if it doesn't exist.
 
+        Args:
+            writer_mode (str, optional): 'direct' writes each row on the caller thread,
+                'buffered' queues rows to a background writer. Defaults to 'direct'.
+            fsync_policy (str, optional): Buffered mode only; 'row', 'rows' or 'shutdown'. Defaults to 'shutdown'.
+            fsync_rows (int, optional): Buffered mode only; rows between fsync calls for the 'rows' policy. Defaults to 10.
+            flush_rows (int, optional): Buffered mode only; rows buffered before a flush. Defaults to 10.
+            flush_seconds (float, optional): Buffered mode only; max seconds a row stays buffered. Defaults to 1.0.
+            archive (bool, optional): Compress the logfiles of past days after each rollover. Defaults to False.
+            station (str, optional): Multi-station mode; rows go to this station's own segment
+                CCAR_EOL_<date>.<station>.csv, written under an advisory lock. Defaults to None (single logfile).
+
         Returns:
             None
         """
+        self.writer = None
+        self.archive = archive
+        self.station = re.sub(r"[^\w-]", "_", str(station)) if station else None
         try:
             logger.debug(f"Initializing {__class__.__name__}")
+            self.limits = LimitTable(testname_path)
+            self.engine = LimitEngine(self.limits)
+            # Last row written per serial number, to build fail strings without reading the logfile.
+            self.last_rows = {}
+            self.last_serial = None
+            # Callbacks that receive every row written, e.g. running analytics.
+            self.subscribers = []
+            # Callbacks that receive the step results of every unit, e.g. the step statistics.
+            self.step_subscribers = []
+            self.indexed_logfile = None
             self._create_log()
+
+            if str(writer_mode).lower() == "buffered":
+                self.writer = LogWriter(fsync_policy, fsync_rows, flush_rows, flush_seconds,
+                                        lock_files=self.station is not None)
+                # Rows still queued are written when the interpreter exits.
+                atexit.register(self.close)
+            logger.debug(f"Logfile writer mode: {writer_mode}")
+
+            # Days left uncompressed by a previous run are archived on start-up.
+            if self.archive:
+                self._start_archive()
         except Exception as e:
             logger.exception(f"An error occurred when initializing History: {e}")
+
+    def close(self):
+        """
+        Writes the rows still queued by the buffered writer and closes the logfile.
+
+        Returns:
+            None
+        """
+        try:
+            if self.writer is not None:
+                self.writer.close()
+        except Exception as e:
+            logger.exception(f"Error closing the logfile writer: {e}")
     
     def _generate_logfile_name(self):
         """
@@ -51,6 +110,8 @@ class History:
             str: The generated logfile name.
         """
         today = datetime.now().strftime("%m-%d-%Y")
+        if self.station:
+            return f"CCAR_EOL_{today}.{self.station}.csv"
         return f"CCAR_EOL_{today}.csv"
     
     def _generate_logfile_path(self):
@@ -71,24 +132,75 @@ class History:
         """
         Creates a new log file if it doesn't exist.
 
+        The header is written to a temporary file that is then linked to the
+        logfile name, which fails if another writer created the logfile first,
+        so rows are never appended to a missing or half written header.
+
         Returns:
             None
         """
-        info_columns = ["Date", "PartNumber", "StartTime", 
-         "EndTime", "TraceEnable", "TestResult", "SerialNumber"]
         try:
             self.logfile_path = self._generate_logfile_path()
             if not os.path.exists(self.logfile_path):
-                with open(self.logfile_path, mode='w', newline='') as file:
-                    writer = csv.writer(file)
-                    header = self._get_header()
-                    writer.writerows(header)
-                    final_row = info_columns + [""] * (len(header[0]) - 7)
-                    writer.writerow(final_row)
-                logger.debug(f"New logfile was created: {self.logfile_name}")
+                temp_path = f"{self.logfile_path}.{os.getpid()}.tmp"
+                with open(temp_path, mode='w', newline='') as file:
+                    self._write_header(csv.writer(file))
+                try:
+                    os.link(temp_path, self.logfile_path)
+                    logger.debug(f"New logfile was created: {self.logfile_name}")
+                except FileExistsError:
+                    logger.debug(f"Logfile was created by another writer: {self.logfile_name}")
+                except OSError:
+                    # Shares without hard links (SMB, FAT) create the logfile exclusively instead.
+                    self._create_log_exclusive()
+                finally:
+                    os.remove(temp_path)
         except Exception as e:
             logger.exception(f"Error creating log file: {e}")
+
+    def _create_log_exclusive(self):
+        """
+        Creates the logfile with its header, unless another writer created it first.
+
+        Returns:
+            None
+        """
+        try:
+            fd = os.open(self.logfile_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            logger.debug(f"Logfile was created by another writer: {self.logfile_name}")
+            return
+        with os.fdopen(fd, mode='w', newline='') as file:
+            self._write_header(csv.writer(file))
+        logger.debug(f"New logfile was created: {self.logfile_name}")
+
+    def _write_header(self, writer):
+        """
+        Writes the limits header and the info column names that start every log file.
+
+        Args:
+            writer (csv.writer): The writer of the new log file.
+
+        Returns:
+            None
+        """
+        info_columns = ["Date", "PartNumber", "StartTime", 
+         "EndTime", "TraceEnable", "TestResult", "SerialNumber"]
+        header = self._get_header()
+        writer.writerows(header)
+        final_row = info_columns + [""] * (len(header[0]) - INFO_COLUMNS)
+        writer.writerow(final_row)
     
+    def _start_archive(self):
+        """
+        Compresses the logfiles of past days on a background thread.
+
+        Returns:
+            None
+        """
+        Thread(target=archive_closed_days, args=(self.logfile_path, logfiles_dir, self.station),
+               name="LogArchive", daemon=True).start()
+
     def _get_column_data(self, column):
         """
         Retrieves data from a specific column in the testname file.
@@ -100,12 +212,11 @@ class History:
             list: A list containing the data from the specified column.
 
         Exception:
-            Exception: If an error occurs while reading or processing the testname file.
+            Exception: If an error occurs while reading the cached limit table.
         """
         try:
-            with open(testname_path, 'r') as file:
-                column_data = [line.strip().split(',')[column] for line in file]
-            return column_data
+            self.limits.reload()
+            return list(self.limits.columns()[column])
         except Exception as e:
             logger.exception(f"Error getting column data: {e}")
             return []
@@ -114,29 +225,19 @@ class History:
         """
         Retrieves header data from different columns in the testname file.
 
+        The testname file is parsed once by the limit table and only parsed
+        again when its mtime changes.
+
         Returns:
             list: A list containing rows of testnames, low_limits, high_limits,
                   expected_values, units, and logic_operators.
 
         Exception:
-            Exception: If an error occurs while reading or processing the testname file.
+            Exception: If an error occurs while reading the cached limit table.
         """
         try:
-            blanks = [""] * 6
-            testnames = blanks + self._get_column_data(0)
-            low_limits = blanks + self._get_column_data(1)
-            high_limits = blanks + self._get_column_data(2)
-            expected_values = blanks + self._get_column_data(3)
-            units = blanks + self._get_column_data(4)
-            logic_operators = blanks + self._get_column_data(5)
-            test_rows = [
-                testnames,
-                low_limits,
-                high_limits,
-                expected_values,
-                units,
-                logic_operators]
-            return test_rows
+            self.limits.reload()
+            return self.limits.header()
         except Exception as e:
             logger.exception(f"Error getting header data: {e}")
             return []
@@ -160,21 +261,102 @@ class History:
         """
         Date = datetime.now().strftime("%H:%M:%S")
         try:
+            previous_path = getattr(self, "logfile_path", None)
             self._create_log()
-            expected_length_tests = len(self._get_header()[0]) - 7
+            self.limits.reload()
+            expected_length_tests = self.limits.test_count
             
             result_data = result_data + [""] * (expected_length_tests - len(result_data))
             data = [Date, PartNumber, StartTime, EndTime, 
                     TraceEnable, TestResult, SerialNumber] + result_data
             
-            with open(self.logfile_path, mode='a', newline='') as file:
-                writer = csv.writer(file)
-                writer.writerow(data)
+            self._write_row(data)
+            self._index_row(data)
+            self._notify(data)
+
+            if self.archive and previous_path != self.logfile_path:
+                if self.writer is not None:
+                    # The writer closes the previous day file once it writes the new day row.
+                    self.writer.drain()
+                self._start_archive()
                 
             logger.debug(f"add data to serial:{result_data[0]}")
         except Exception as e:
             logger.exception(f"Error adding results to logs: {e}")
     
+    def _generate_steps_path(self):
+        """
+        Generates the path of the day file with the step timings, next to the logfile.
+
+        Returns:
+            str: The path STEPS_<date>.csv, or STEPS_<date>.<station>.csv in multi-station mode.
+        """
+        today = datetime.now().strftime("%m-%d-%Y")
+        name = f"STEPS_{today}.{self.station}.csv" if self.station else f"STEPS_{today}.csv"
+        return os.path.join(logfiles_dir, name)
+
+    def add_step_results(self, SerialNumber, StartTime, step_results):
+        """
+        Adds the timing and verdict of every step of a unit to the day steps file.
+
+        Args:
+            SerialNumber (str): The DUT serial number.
+            StartTime (str): The start time of the test, as in the logfile row.
+            step_results (list): The StepResult records of the unit.
+
+        Returns:
+            None
+        """
+        if not step_results:
+            return
+        try:
+            path = self._generate_steps_path()
+            rows = [[datetime.now().strftime("%H:%M:%S"), SerialNumber, StartTime, result.name,
+                     "" if result.duration is None else f"{result.duration:.3f}",
+                     result.measurement, result.verdict, result.error or "",
+                     "" if result.position is None else result.position]
+                    for result in step_results]
+            lock = FileLock(path) if self.station else nullcontext()
+            with lock, open(path, mode='a', newline='') as file:
+                writer = csv.writer(file)
+                if file.tell() == 0:
+                    writer.writerow(STEPS_HEADER)
+                writer.writerows(rows)
+            self._notify_steps(step_results)
+        except Exception as e:
+            logger.exception(f"Error adding step results: {e}")
+
+    def read_step_history(self, days=7):
+        """
+        Reads the step runs of the steps files of the last days, of every station.
+
+        Args:
+            days (int, optional): The number of days read, today included. Defaults to 7.
+
+        Returns:
+            list: (step, duration, verdict) tuples of strings, oldest day first.
+        """
+        rows = []
+        try:
+            first_day = datetime.now().date() - timedelta(days=days - 1)
+            files = []
+            for name in os.listdir(logfiles_dir):
+                if not (name.startswith("STEPS_") and name.endswith(".csv")):
+                    continue
+                # STEPS_MM-DD-YYYY.csv or STEPS_MM-DD-YYYY.<station>.csv
+                try:
+                    day = datetime.strptime(name[len("STEPS_"):len("STEPS_MM-DD-YYYY")], "%m-%d-%Y").date()
+                except ValueError:
+                    continue
+                if day >= first_day:
+                    files.append((day, name))
+            for day, name in sorted(files):
+                with open(os.path.join(logfiles_dir, name), mode='r', newline='') as file:
+                    rows.extend((row["Step"], row["Duration"], row["Verdict"]) for row in csv.DictReader(file))
+        except Exception as e:
+            logger.exception(f"Error reading the step history: {e}")
+        return rows
+
     def _get_rows(self, path):
         """
         Reads and returns the rows from a file.
@@ -221,33 +403,229 @@ class History:
             logger.exception(f"Error getting columns by name: {e}")
             return []
         
-    def get_fail_string(self, testname):
+    def _write_row(self, data):
+        """
+        Appends a row to the log file, directly or through the buffered writer.
+
+        Args:
+            data (list): The row to write.
+
+        Returns:
+            None
+        """
+        if self.writer is not None:
+            self.writer.write(self.logfile_path, data)
+        elif self.station:
+            with FileLock(self.logfile_path), open(self.logfile_path, mode='a', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(data)
+        else:
+            with open(self.logfile_path, mode='a', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(data)
+
+    def subscribe(self, callback):
+        """
+        Registers a callback called with every row added to the logs.
+
+        Args:
+            callback (callable): Receives the row (list) in logfile layout.
+
+        Returns:
+            None
+        """
+        self.subscribers.append(callback)
+
+    def subscribe_steps(self, callback):
+        """
+        Registers a callback called with the step results of every unit added to the logs.
+
+        Args:
+            callback (callable): Receives the StepResult records (list) of the unit.
+
+        Returns:
+            None
+        """
+        self.step_subscribers.append(callback)
+
+    def _notify_steps(self, step_results):
+        """
+        Passes the step results written to the step subscribers; their errors never stop the logging.
+
+        Args:
+            step_results (list): The StepResult records written.
+
+        Returns:
+            None
+        """
+        for callback in self.step_subscribers:
+            try:
+                callback(step_results)
+            except Exception as e:
+                logger.exception(f"Error in step results subscriber: {e}")
+
+    def _notify(self, data):
+        """
+        Passes a row written to the subscribers; their errors never stop the logging.
+
+        Args:
+            data (list): The row written.
+
+        Returns:
+            None
+        """
+        for callback in self.subscribers:
+            try:
+                callback(data)
+            except Exception as e:
+                logger.exception(f"Error in logs subscriber: {e}")
+
+    def _index_row(self, data):
+        """
+        Keeps the row written as the most recent result of its serial number.
+
+        The index is dropped when the logfile changes (day rollover).
+
+        Args:
+            data (list): The row written to the log file.
+
+        Returns:
+            None
+        """
+        if self.indexed_logfile != self.logfile_path:
+            self.last_rows = {}
+            self.indexed_logfile = self.logfile_path
+        serial = str(data[INFO_COLUMNS - 1])
+        self.last_rows[serial] = data
+        self.last_serial = serial
+
+    def _tail_row(self, path, serial=None, block_size=8192):
+        """
+        Reads the log file backwards and returns the last data row.
+
+        Only used when the row is not in the in-memory index, e.g. after a restart.
+
+        Args:
+            path (str): The path to the CSV file.
+            serial (str, optional): Return the last row of this serial number. Defaults to None (any serial).
+            block_size (int, optional): The number of bytes read on each step back. Defaults to 8192.
+
+        Returns:
+            list: The row found, None if the file has no matching data row.
+        """
+        try:
+            with open(path, mode='rb') as file:
+                file.seek(0, os.SEEK_END)
+                position = file.tell()
+                remainder = b""
+                while position > 0:
+                    step = min(block_size, position)
+                    position -= step
+                    file.seek(position)
+                    chunk = file.read(step) + remainder
+                    lines = chunk.split(b"\n")
+                    # The first line may be cut by the block boundary, keep it for the next step.
+                    remainder = lines.pop(0) if position > 0 else b""
+                    for line in reversed(lines):
+                        row = self._parse_data_row(line)
+                        if row is None:
+                            continue
+                        if row is False:
+                            return None
+                        if serial is None or row[INFO_COLUMNS - 1] == str(serial):
+                            return row
+            return None
+        except Exception as e:
+            logger.exception(f"Error reading the last row: {e}")
+            return None
+
+    def _parse_data_row(self, line):
+        """
+        Parses a raw logfile line.
+
+        Args:
+            line (bytes): The line read from the log file.
+
+        Returns:
+            list: The data row, None for an empty line or False once the header is reached.
+        """
+        text = line.decode().strip()
+        if not text:
+            return None
+        row = next(csv.reader([text]))
+        # Limit rows start with blanks and the column names row with "Date".
+        if row[0] in ("", "Date"):
+            return False
+        return row
+
+    def _get_last_row(self, serial=None):
+        """
+        Retrieves the most recent row written, from the index or from the end of the log file.
+
+        Args:
+            serial (str, optional): The DUT serial number. Defaults to None (last row written).
+
+        Returns:
+            list: The row found, None if there is no row.
+        """
+        if self.indexed_logfile == self.logfile_path:
+            key = self.last_serial if serial is None else str(serial)
+            if key in self.last_rows:
+                return self.last_rows[key]
+        return self._tail_row(self.logfile_path, serial)
+
+    def evaluate(self, serial=None):
+        """
+        Evaluates the most recent results against the limits of the testname file.
+
+        Args:
+            serial (str, optional): The DUT serial number. Defaults to None (last row written).
+
+        Returns:
+            Evaluation: The verdict per testname, the overall result and the first step that failed.
+                        None if there is no result.
+        """
+        row = self._get_last_row(serial)
+        if row is None:
+            return None
+        return self.engine.evaluate(row[INFO_COLUMNS:])
+
+    def get_fail_string(self, testname=None, serial=None):
         """
         Retrieves failure information for a specific testname.
 
         Args:
-            testname (str): The testname to search for.
+            testname (str, optional): The testname to search for. Defaults to None,
+                the first step failing its limits in the most recent results.
+            serial (str, optional): The DUT serial number. Defaults to None (last row written).
 
         Returns:
             str: A formatted string containing failure information.
 
         Raises:
-            Exception: If an error occurs while processing the testname file or log file.
+            Exception: If the testname is unknown or there is no result for it.
         """
         try:
-            lines = self._get_rows(testname_path)
-            for line in lines:
-                if testname in line:
-                    low_limit = line.split(',')[1]
-                    high_limit = line.split(',')[2]
-                    expect_value = line.split(',')[3]
-                    unit = line.split(',')[4]
-                    logic_operator = line.split(',')[5]
-
-            column_data = self._get_columns_byname(self.logfile_path, testname)
-            test_measurement = column_data[-1]
-            fail_string = f"|ftestres=0,{testname},{test_measurement},{high_limit},{low_limit},{expect_value},{unit},{logic_operator}"
+            row = self._get_last_row(serial)
+            if row is None:
+                raise LookupError(f"No results found in {self.logfile_name}")
+            if testname is None:
+                testname = self.engine.evaluate(row[INFO_COLUMNS:]).failing_step
+                if testname is None:
+                    raise LookupError("No step failed its limits.")
+
+            self.limits.reload()
+            limits = self.limits.get_limits(testname)
+            if limits is None:
+                raise KeyError(f"Testname not found in {testname_fname}: {testname}")
+
+            column = self.limits.column_index[testname]
+            test_measurement = row[column] if column < len(row) else ""
+
+            fail_string = (f"|ftestres=0,{testname},{test_measurement},{limits['high_limit']},"
+                           f"{limits['low_limit']},{limits['expected_value']},{limits['unit']},"
+                           f"{limits['logic_operator']}")
             return fail_string
         except Exception as e:
             logger.exception(f"Error getting fail string: {e}")
-            return ""
\ No newline at end of file
+            return ""
@@ -0,0 +1,193 @@
+"""
+This module keeps running failure and duration statistics of the test steps and orders the
+steps of a unit so the likely failures are found first
+"""
+
+import logging
+from collections import deque
+from threading import Lock
+from report.reader import to_bool
+
+logger = logging.getLogger("DUT_logger")
+
+
+class StepStats:
+    def __init__(self, window):
+        """
+        Initialize the statistics of a step over its last runs.
+
+        Args:
+            window (int): The number of last runs kept.
+
+        Returns:
+            None
+        """
+        self.runs = deque(maxlen=window)
+        self.fails = 0
+        self.median = None
+
+    def add(self, duration, failed):
+        """
+        Adds a run, in constant time; the median is computed again when it is read.
+
+        Returns:
+            None
+        """
+        if len(self.runs) == self.runs.maxlen:
+            self.fails -= self.runs[0][1]
+        self.runs.append((duration, failed))
+        self.fails += failed
+        self.median = None
+
+    @property
+    def failure_probability(self):
+        """
+        The failure rate of the last runs, with a Laplace prior so a step with no failures yet is not 0.
+        """
+        return (self.fails + 1) / (len(self.runs) + 2)
+
+    @property
+    def median_duration(self):
+        """
+        The median seconds of the last runs with a duration, None if there is none.
+        """
+        if self.median is None:
+            durations = sorted(duration for duration, _ in self.runs if duration is not None)
+            if durations:
+                self.median = durations[len(durations) // 2]
+        return self.median
+
+
+class StepStatistics:
+    def __init__(self, window=200):
+        """
+        Initialize empty step statistics.
+
+        Args:
+            window (int, optional): The last runs of each step kept, so the order follows recent yield. Defaults to 200.
+
+        Returns:
+            None
+        """
+        self.window = window
+        self.lock = Lock()
+        self.steps = {}
+
+    def add(self, name, duration, verdict):
+        """
+        Adds a run of a step.
+
+        Args:
+            name (str): The step name.
+            duration (float): The seconds the step took, None if unknown.
+            verdict (bool): True if the step passed.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            stats = self.steps.get(name)
+            if stats is None:
+                stats = self.steps[name] = StepStats(self.window)
+            stats.add(duration, verdict is not True)
+
+    def add_step_results(self, step_results):
+        """
+        Adds the StepResult records of a unit.
+
+        Returns:
+            None
+        """
+        for result in step_results:
+            self.add(result.name, result.duration, result.verdict)
+
+    def load(self, rows):
+        """
+        Adds the runs of the history.
+
+        Args:
+            rows (iterable): (step, duration, verdict) tuples, oldest first, e.g. History.read_step_history().
+                Duration and verdict may be the strings of the steps file.
+
+        Returns:
+            None
+        """
+        count = 0
+        for name, duration, verdict in rows:
+            try:
+                duration = float(duration) if duration not in (None, "") else None
+            except ValueError:
+                duration = None
+            if isinstance(verdict, str):
+                verdict = to_bool(verdict)
+            self.add(name, duration, verdict)
+            count += 1
+        logger.debug(f"Step statistics loaded: {count} runs of {len(self.steps)} steps")
+
+    def attach(self, history):
+        """
+        Subscribes to a History so the step results of every unit update the statistics.
+
+        Args:
+            history (History): The history to follow.
+
+        Returns:
+            None
+        """
+        history.subscribe_steps(self.add_step_results)
+
+    def summary(self):
+        """
+        Gets the statistics of every step.
+
+        Returns:
+            dict: Per step: runs, fails, failure_probability and median_duration.
+        """
+        with self.lock:
+            return {name: {"runs": len(stats.runs),
+                           "fails": stats.fails,
+                           "failure_probability": stats.failure_probability,
+                           "median_duration": stats.median_duration}
+                    for name, stats in self.steps.items()}
+
+    def order(self, names, depends=None, min_runs=20):
+        """
+        Orders steps to reach the first failure of a unit as soon as possible.
+
+        Running steps by ascending median duration / failure probability minimises the expected
+        time to the first failure of independent steps. Steps with dependencies are placed
+        greedily: each position takes the lowest ratio among the steps whose dependencies
+        are already placed, so the declared order constraints always hold.
+
+        Args:
+            names (list): The step names in sequence order; ties keep it.
+            depends (dict, optional): The names of the steps that must run before each step. Defaults to None.
+            min_runs (int, optional): The runs every step needs before the order changes. Defaults to 20.
+
+        Returns:
+            list: The step names in the order to run them; the sequence order while the history is too short.
+        """
+        depends = depends or {}
+        with self.lock:
+            scores = {}
+            for name in names:
+                stats = self.steps.get(name)
+                if stats is None or len(stats.runs) < min_runs or stats.median_duration is None:
+                    return list(names)
+                scores[name] = stats.median_duration / stats.failure_probability
+
+        order = []
+        placed = set()
+        remaining = list(names)
+        while remaining:
+            ready = [name for name in remaining
+                     if placed.issuperset(dependency for dependency in depends.get(name, ()) if dependency in scores)]
+            if not ready:
+                # A dependency cycle, the engine reports it; the rest keep the sequence order.
+                order.extend(remaining)
+                break
+            name = min(ready, key=lambda name: scores[name])
+            order.append(name)
+            placed.add(name)
+            remaining.remove(name)
+        return order
@@ -0,0 +1,126 @@
+"""
+This module runs the Kimball Traceability calls on a bounded worker pool
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from exceptions import TraceabilityError
+
+logger = logging.getLogger("traceability_logger")
+
+
+class AsyncTrace:
+    def __init__(self, trace, max_workers=4, timeout=30):
+        """
+        Initialize a future based facade over a Kimball_Trace instance.
+
+        Every call is dispatched to the worker pool and returns a concurrent.futures.Future
+        right away, so the operator UI is not frozen while the server answers.
+
+        Args:
+            trace (Kimball_Trace): The traceability system instance.
+            max_workers (int, optional): The maximum number of calls in flight. Defaults to 4.
+            timeout (float, optional): Default seconds to wait for a call in result(). Defaults to 30.
+
+        Returns:
+            None
+        """
+        self.trace = trace
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="trace")
+        logger.debug(f"Initializing {__class__.__name__} with {max_workers} workers")
+
+    def submit(self, function, *args, **kwargs):
+        """
+        Dispatches a call to the worker pool.
+
+        Args:
+            function (callable): The call to run.
+
+        Returns:
+            Future: The future of the call.
+        """
+        return self.executor.submit(function, *args, **kwargs)
+
+    def valid_partnumber(self, serial_number):
+        """
+        Starts the part number check of Kimball_Trace.valid_partnumber.
+
+        Returns:
+            Future: Resolves to the bool result.
+        """
+        return self.submit(self.trace.valid_partnumber, serial_number)
+
+    def start_test(self, serial_number):
+        """
+        Starts the backcheck of Kimball_Trace.start_test for a serial number.
+
+        Returns:
+            Future: Resolves to the bool result.
+        """
+        return self.submit(self.trace.start_test, serial_number)
+
+    def prevalidate(self, serial_number):
+        """
+        Starts the combined checks of Kimball_Trace.prevalidate for a serial number.
+
+        Returns:
+            Future: Resolves to the bool verdict.
+        """
+        return self.submit(self.trace.prevalidate, serial_number)
+
+    def send_result(self, test_result, fail_string, employee):
+        """
+        Starts the result upload of Kimball_Trace.send_result.
+
+        Returns:
+            Future: Resolves to the bool result.
+        """
+        return self.submit(self.trace.send_result, test_result, fail_string, employee)
+
+    def get_date(self):
+        """
+        Starts the datetime request of Kimball_Trace.get_date.
+
+        Returns:
+            Future: Resolves to the datetime string.
+        """
+        return self.submit(self.trace.get_date)
+
+    def result(self, future, timeout=None):
+        """
+        Waits for a call to end; the call is cancelled if it does not end in time.
+
+        A call already running on the server cannot be interrupted, its result is discarded.
+
+        Args:
+            future (Future): The future returned by one of the calls.
+            timeout (float, optional): Seconds to wait. Defaults to the facade timeout.
+
+        Returns:
+            The result of the call.
+
+        Raises:
+            TraceabilityError: If the call does not end in time.
+            Exception: The exception raised by the call.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            logger.error(f"A traceability call did not answer in {timeout} seconds.")
+            raise TraceabilityError(f"The traceability system did not answer in {timeout} seconds.")
+
+    def shutdown(self, wait=True):
+        """
+        Cancels the calls not started yet and stops the worker pool.
+
+        Args:
+            wait (bool, optional): Wait for the running calls to end. Defaults to True.
+
+        Returns:
+            None
+        """
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+        logger.debug(f"{__class__.__name__} worker pool stopped.")
@@ -0,0 +1,208 @@
+"""
+This module writes the daily logfile rows from a background thread
+"""
+
+import os
+import csv
+import time
+import queue
+import logging
+from threading import Thread, Lock
+from report.locking import FileLock
+
+logger = logging.getLogger("DUT_logger")
+
+# fsync policies of the buffered writer.
+FSYNC_ROW = "row"
+FSYNC_ROWS = "rows"
+FSYNC_SHUTDOWN = "shutdown"
+FSYNC_POLICIES = (FSYNC_ROW, FSYNC_ROWS, FSYNC_SHUTDOWN)
+
+# Queue items that flush the buffered rows and stop the writer thread.
+_FLUSH = object()
+_STOP = None
+
+
+class LogWriter:
+    def __init__(self, fsync_policy=FSYNC_SHUTDOWN, fsync_rows=10, flush_rows=10, flush_seconds=1.0,
+                 lock_files=False):
+        """
+        Initialize the writer and start its background thread.
+
+        Args:
+            fsync_policy (str, optional): When rows are forced to disk; 'row', 'rows' or 'shutdown'. Defaults to 'shutdown'.
+            fsync_rows (int, optional): Rows between fsync calls for the 'rows' policy. Defaults to 10.
+            flush_rows (int, optional): Rows buffered before they are flushed to the file. Defaults to 10.
+            flush_seconds (float, optional): Max seconds a row stays buffered before it is flushed. Defaults to 1.0.
+            lock_files (bool, optional): Hold an advisory lock on the file while it is open. Defaults to False.
+
+        Raises:
+            ValueError: If the fsync policy is unrecognized.
+        """
+        fsync_policy = str(fsync_policy).lower()
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unrecognized fsync policy: {fsync_policy}, use one of {FSYNC_POLICIES}")
+        self.fsync_policy = fsync_policy
+        self.fsync_rows = max(1, int(fsync_rows))
+        self.flush_rows = max(1, int(flush_rows))
+        self.flush_seconds = float(flush_seconds)
+        self.lock_files = lock_files
+        self.file_lock = None
+
+        self.queue = queue.Queue()
+        self.file = None
+        self.path = None
+        self.writer = None
+        self.unflushed = 0
+        self.unsynced = 0
+        self.last_flush = time.monotonic()
+        self.closed = False
+        self.close_lock = Lock()
+
+        self.thread = Thread(target=self._run, name="LogWriter", daemon=True)
+        self.thread.start()
+        logger.debug(f"Buffered log writer started, fsync policy: {self.fsync_policy}")
+
+    def write(self, path, row):
+        """
+        Queues a row to be appended to a logfile.
+
+        Args:
+            path (str): The logfile path; a new path closes the previous file (day rollover).
+            row (list): The row to append.
+
+        Returns:
+            None
+
+        Raises:
+            RuntimeError: If the writer was already closed.
+        """
+        if self.closed:
+            raise RuntimeError("The log writer is closed.")
+        self.queue.put((path, row))
+
+    def drain(self):
+        """
+        Blocks until every queued row was written and flushed.
+
+        Returns:
+            None
+        """
+        if not self.closed:
+            self.queue.put(_FLUSH)
+            self.queue.join()
+
+    def close(self):
+        """
+        Drains the queue, syncs the file to disk and stops the background thread.
+
+        Safe to call more than once.
+
+        Returns:
+            None
+        """
+        with self.close_lock:
+            if self.closed:
+                return
+            self.closed = True
+        self.queue.put(_STOP)
+        self.thread.join()
+        logger.debug("Buffered log writer closed.")
+
+    def _run(self):
+        """
+        Background loop: writes queued rows and flushes them by row count or time.
+
+        Returns:
+            None
+        """
+        while True:
+            timeout = max(0.0, self.flush_seconds - (time.monotonic() - self.last_flush))
+            try:
+                item = self.queue.get(timeout=timeout if self.unflushed else None)
+            except queue.Empty:
+                self._flush()
+                continue
+            try:
+                if item is _STOP:
+                    self._close_file()
+                    return
+                if item is _FLUSH:
+                    self._flush()
+                    continue
+                path, row = item
+                self._write_row(path, row)
+            except Exception as e:
+                logger.exception(f"Error writing row to logfile: {e}")
+            finally:
+                self.queue.task_done()
+
+    def _write_row(self, path, row):
+        """
+        Appends a row to the open file, opening the file of a new day if needed.
+
+        Args:
+            path (str): The logfile path.
+            row (list): The row to append.
+
+        Returns:
+            None
+        """
+        if path != self.path:
+            self._close_file()
+            if self.lock_files:
+                self.file_lock = FileLock(path)
+                self.file_lock.acquire()
+            self.file = open(path, mode='a', newline='')
+            self.writer = csv.writer(self.file)
+            self.path = path
+            logger.debug(f"Log writer opened: {os.path.basename(path)}")
+
+        self.writer.writerow(row)
+        self.unflushed += 1
+        self.unsynced += 1
+
+        if self.fsync_policy == FSYNC_ROW:
+            self._flush(sync=True)
+        elif self.fsync_policy == FSYNC_ROWS and self.unsynced >= self.fsync_rows:
+            self._flush(sync=True)
+        elif self.unflushed >= self.flush_rows or time.monotonic() - self.last_flush >= self.flush_seconds:
+            self._flush()
+
+    def _flush(self, sync=False):
+        """
+        Flushes the buffered rows to the file.
+
+        Args:
+            sync (bool, optional): Also fsync the file to disk. Defaults to False.
+
+        Returns:
+            None
+        """
+        self.last_flush = time.monotonic()
+        if self.file is None:
+            return
+        self.file.flush()
+        self.unflushed = 0
+        if sync:
+            os.fsync(self.file.fileno())
+            self.unsynced = 0
+
+    def _close_file(self):
+        """
+        Flushes, syncs and closes the open file.
+
+        Returns:
+            None
+        """
+        if self.file is None:
+            return
+        self._flush(sync=True)
+        self.file.close()
+        if self.file_lock is not None:
+            self.file_lock.release()
+            self.file_lock = None
+        logger.debug(f"Log writer closed: {os.path.basename(self.path)}")
+        self.file = None
+        self.writer = None
+        self.path = None
@@ -0,0 +1,232 @@
+"""
+The sequencer runs the test steps of a unit as a dependency graph, overlapping the
+steps that neither depend on each other nor share a DUT resource.
+"""
+import time
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger("test_logger")
+
+
+class StepResult:
+    def __init__(self, name, start=None, end=None, measurement="", verdict=None, error=None, position=None):
+        """
+        Initialize the result record of a step.
+
+        Args:
+            name (str): The step name.
+            start (float, optional): time.monotonic() when the step started. Defaults to None.
+            end (float, optional): time.monotonic() when the step ended. Defaults to None.
+            measurement (str, optional): The values the step recorded. Defaults to "".
+            verdict (bool, optional): True if the step passed. Defaults to None (not run).
+            error (str, optional): The exception raised or the timeout. Defaults to None.
+            position (int, optional): The place of the step in the order chosen for the unit, from 1. Defaults to None.
+
+        Returns:
+            None
+        """
+        self.name = name
+        self.start = start
+        self.end = end
+        self.measurement = measurement
+        self.verdict = verdict
+        self.error = error
+        self.position = position
+
+    @property
+    def duration(self):
+        """
+        The seconds the step took, None if it did not end.
+        """
+        if self.start is None or self.end is None:
+            return None
+        return self.end - self.start
+
+    def __repr__(self):
+        return (f"StepResult({self.name!r}, duration={self.duration}, measurement={self.measurement!r}, "
+                f"verdict={self.verdict}, error={self.error!r})")
+
+
+class Step:
+    def __init__(self, name, function, depends=(), resources=(), timeout=None, inline=False):
+        """
+        Initialize a step of the sequence.
+
+        Args:
+            name (str): The step name, as in [TestSequence] sequence.
+            function (callable): Runs the step, called without arguments.
+            depends (iterable, optional): Names of the steps that must end before this one. Defaults to ().
+            resources (iterable, optional): DUT resources used exclusively by the step, e.g. "modem". Defaults to ().
+            timeout (float, optional): Seconds the step may run. Defaults to None (no limit).
+            inline (bool, optional): Run on the thread calling SequenceEngine.run, for the steps opening
+                operator windows, since the GUI is not thread safe; it has no timeout. Defaults to False.
+
+        Returns:
+            None
+        """
+        self.name = name
+        self.function = function
+        self.depends = tuple(depends)
+        self.resources = frozenset(resources)
+        self.inline = inline
+        self.timeout = None if inline else timeout or None
+
+    def __repr__(self):
+        return f"Step({self.name!r}, depends={self.depends}, resources={sorted(self.resources)})"
+
+
+class SequenceEngine:
+    def __init__(self, steps, max_workers=3):
+        """
+        Initialize the engine and check the dependency graph.
+
+        Args:
+            steps (list): The Step objects, in sequence order; ties between ready steps follow it.
+            max_workers (int, optional): The maximum number of steps running at once. Defaults to 3.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If a step depends on an unknown step or the dependencies have a cycle.
+        """
+        self.steps = {step.name: step for step in steps}
+        self.max_workers = max(1, max_workers)
+        self.order = self._topological_order(steps)
+        self.completed = []
+        self.skipped = []
+        self.timed_out = []
+        self.started_at = {}
+
+    def _topological_order(self, steps):
+        """
+        Sorts the steps so every step comes after its dependencies, keeping the sequence order otherwise.
+
+        Returns:
+            list: The sorted Step objects.
+        """
+        for step in steps:
+            unknown = [name for name in step.depends if name not in self.steps]
+            if unknown:
+                raise ValueError(f"Step {step.name} depends on unknown steps: {unknown}")
+
+        order = []
+        placed = set()
+        remaining = list(steps)
+        while remaining:
+            ready = [step for step in remaining if placed.issuperset(step.depends)]
+            if not ready:
+                raise ValueError(f"The step dependencies have a cycle: {[step.name for step in remaining]}")
+            for step in ready:
+                order.append(step)
+                placed.add(step.name)
+                remaining.remove(step)
+        return order
+
+    def run(self, should_stop=lambda: False):
+        """
+        Runs the steps, starting every step whose dependencies ended and whose resources are free.
+
+        When should_stop() turns True, a step raises or a step runs past its timeout, no
+        more steps are started. The running steps are waited for, since a thread cannot be
+        interrupted, except the timed out ones: they are abandoned with their resources held.
+        Inline steps run on the calling thread while the pool steps keep running.
+
+        Args:
+            should_stop (callable, optional): Checked after every step, e.g. the fail flag of the unit.
+                Defaults to never.
+
+        Returns:
+            list: The names of the completed steps in completion order. The steps not
+                  started are kept in self.skipped and the timed out ones in self.timed_out.
+
+        Raises:
+            Exception: The first exception raised by a step.
+        """
+        self.completed = []
+        self.timed_out = []
+        self.started_at = {}
+        pending = list(self.order)
+        running = {}
+        deadlines = {}
+        held = set()
+        done = set()
+        error = None
+        stopped = False
+
+        def finish(step, future):
+            nonlocal error, stopped
+            held.difference_update(step.resources)
+            try:
+                future.result()
+                done.add(step.name)
+                self.completed.append(step.name)
+            except Exception as e:
+                logger.exception(f"Sequence: {step.name} raised an exception: {e}")
+                error = error or e
+                stopped = True
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="step")
+        try:
+            while pending or running:
+                inline = None
+                if not stopped:
+                    for step in list(pending):
+                        if not step.inline and len(running) >= self.max_workers:
+                            continue
+                        if done.issuperset(step.depends) and held.isdisjoint(step.resources):
+                            pending.remove(step)
+                            held.update(step.resources)
+                            self.started_at[step.name] = time.monotonic()
+                            logger.debug(f"Sequence: {step.name} started")
+                            if step.inline:
+                                inline = step
+                                break
+                            future = executor.submit(step.function)
+                            running[future] = step
+                            if step.timeout:
+                                deadlines[future] = self.started_at[step.name] + step.timeout
+
+                if inline is not None:
+                    future = Future()
+                    try:
+                        future.set_result(inline.function())
+                    except Exception as e:
+                        future.set_exception(e)
+                    finish(inline, future)
+                    if not stopped and should_stop():
+                        logger.debug(f"Sequence: fail-fast, not starting {[step.name for step in pending]}")
+                        stopped = True
+                    continue
+                if not running:
+                    break
+
+                timeout = None
+                if deadlines:
+                    timeout = max(0.0, min(deadlines.values()) - time.monotonic())
+                finished, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    step = running.pop(future)
+                    deadlines.pop(future, None)
+                    finish(step, future)
+
+                now = time.monotonic()
+                for future, deadline in list(deadlines.items()):
+                    if now >= deadline:
+                        step = running.pop(future)
+                        deadlines.pop(future)
+                        self.timed_out.append(step.name)
+                        logger.error(f"Sequence: {step.name} did not end in {step.timeout} s, it is abandoned.")
+                        stopped = True
+
+                if not stopped and should_stop():
+                    logger.debug(f"Sequence: fail-fast, not starting {[step.name for step in pending]}")
+                    stopped = True
+        finally:
+            executor.shutdown(wait=not self.timed_out, cancel_futures=True)
+
+        self.skipped = [step.name for step in pending]
+        if error is not None:
+            raise error
+        return self.completed
@@ -0,0 +1,302 @@
+"""
+The slots module runs a station with several DUT slots at once. Every slot has its own test
+manager, ADB target, power line and traceability context. The operator windows of every slot
+open on the thread of the scheduler, one at a time, and the history writes are shared between
+the slots one at a time.
+"""
+import logging
+from queue import Queue, Empty
+from concurrent.futures import Future
+from threading import Thread, Lock, current_thread
+from gui import popups
+from test_manager import TestManager
+
+logger = logging.getLogger("application_logger")
+
+
+class Slot:
+    def __init__(self, name, kt, test, power=None):
+        """
+        Initialize a slot of the station.
+
+        Args:
+            name (str): The slot name, shown in the operator prompts.
+            kt (Kimball_Trace): The traceability context of the slot, from Kimball_Trace.slot_context().
+            test (TestManager): The test manager of the DUT in the slot.
+            power (tuple, optional): The (device_name, port, line) of the DAQ line powering the slot.
+                Defaults to None (the DUT is powered by hand).
+
+        Returns:
+            None
+        """
+        self.name = name
+        self.kt = kt
+        self.test = test
+        self.power = power
+        self.units = 0
+        # The (serial, operator) of the next unit the operator loads in the slot, None to stop.
+        self.loads = Queue()
+
+    def power_on(self):
+        if self.power is not None:
+            # nidaqmx is only needed by the stations with powered slots.
+            from hardware.control import turn_on_UUT
+            turn_on_UUT(*self.power)
+
+    def power_off(self):
+        if self.power is not None:
+            from hardware.control import turn_off_UTT
+            turn_off_UTT(*self.power)
+
+    def __repr__(self):
+        return f"Slot({self.name!r}, target={self.test.target!r}, power={self.power})"
+
+
+def make_slots(kt, settings, step_stats=None):
+    """
+    Makes the slots of the station from the [SLOT1] ... [SLOTn] sections of the settings.
+
+    A section has the adb_target of the DUT and, for a powered slot, its power_device,
+    power_port and power_line. A missing section makes a slot with no target and no power.
+
+    Args:
+        kt (Kimball_Trace): The traceability system instance shared by the slots.
+        settings (Settings): The current settings.
+        step_stats (StepStatistics, optional): The step statistics shared by the slots. Defaults to None.
+
+    Returns:
+        list: The Slot objects.
+    """
+    slots = []
+    for number in range(1, settings.OPTIONS.slots + 1):
+        name = f"SLOT{number}"
+        section = settings.get_section(name)
+        power = None
+        if section.get("power_device"):
+            power = (section.power_device, int(section.get("power_port", 0)), int(section.get("power_line", number - 1)))
+        test = TestManager(kt.mode, kt.case_settings_lst, target=section.get("adb_target") or None,
+                           step_stats=step_stats)
+        slots.append(Slot(name, kt.slot_context(), test, power))
+    return slots
+
+
+class SlotScheduler:
+    def __init__(self, slots, logfile):
+        """
+        Initialize the scheduler running every slot on a thread of its own.
+
+        Args:
+            slots (list): The Slot objects.
+            logfile (History): The history of the DUTs, shared by the slots.
+
+        Returns:
+            None
+        """
+        self.slots = slots
+        self.logfile = logfile
+        # The GUI windows are not thread safe, the slot threads queue them for the scheduler thread.
+        self.requests = Queue()
+        # The slots waiting for the operator to load a unit, in the order they got free.
+        self.idle = Queue()
+        self.gui_thread = None
+        self.closing = False
+        # The history rows and fail strings of a unit are written together.
+        self.history_lock = Lock()
+        self.operator = None
+        self.last_scan_time = None
+        # The windows the steps open from the slot threads go through the queue too.
+        for slot in self.slots:
+            slot.test.gui = self.gui
+
+    def gui(self, function, *args, **kwargs):
+        """
+        Opens a window on the scheduler thread and waits for it.
+
+        Returns:
+            The result of the window.
+        """
+        if current_thread() is self.gui_thread or self.gui_thread is None:
+            return function(*args, **kwargs)
+        future = Future()
+        self.requests.put((future, function, args, kwargs))
+        return future.result()
+
+    def requests_pending(self):
+        return not self.requests.empty()
+
+    def _serve(self, timeout=None):
+        """
+        Opens the next window a slot thread queued, waiting for one up to timeout seconds.
+
+        Returns:
+            None
+        """
+        try:
+            future, function, args, kwargs = self.requests.get(timeout=timeout)
+        except Empty:
+            return
+        try:
+            future.set_result(function(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+
+    def check_operator(self, slot):
+        """
+        Asks the operator badge when there is none or it expired; the badge is shared by the slots.
+
+        Returns:
+            str: The employee number, None if it was not valid or the prompt gave way to a slot window.
+        """
+        operator, last_scan_time = slot.test.check_operator(self.operator, self.last_scan_time,
+                                                            interrupt=self.requests_pending)
+        if operator is False:
+            return None
+        if operator in [None, '']:
+            popups.ok('Numero de empleado no valido, vuelva a escanear', background_color='red')
+            self.operator = None
+            self.last_scan_time = None
+            return None
+        self.operator = operator
+        self.last_scan_time = last_scan_time
+        return operator
+
+    def run(self):
+        """
+        Runs the slots until the operator cancels the serial prompt, then waits for the units under test.
+
+        The windows queued by the slot threads open first. The serial prompt of an idle slot
+        gives way to them, so a slot waiting for a unit never stops the windows of the slots
+        under test; it opens again once they are answered.
+
+        Returns:
+            int: The number of units tested.
+        """
+        self.gui_thread = current_thread()
+        threads = [Thread(target=self._run_slot, args=(slot,), name=slot.name) for slot in self.slots]
+        for thread in threads:
+            thread.start()
+        idle = []
+        try:
+            while any(thread.is_alive() for thread in threads):
+                try:
+                    while self.requests_pending():
+                        self._serve()
+                    while not self.idle.empty():
+                        idle.append(self.idle.get())
+                    if self.closing:
+                        for slot in idle:
+                            slot.loads.put(None)
+                        idle.clear()
+                    if idle:
+                        self._load(idle)
+                    else:
+                        self._serve(timeout=0.1)
+                except Exception as e:
+                    logger.exception(f"The slot prompts failed, closing the slots: {e}")
+                    self.closing = True
+        finally:
+            self.gui_thread = None
+        return sum(slot.units for slot in self.slots)
+
+    def _load(self, idle):
+        """
+        Asks the operator the serial of the unit for the first idle slot.
+
+        Args:
+            idle (list): The slots waiting for a unit; the loaded slot is removed.
+
+        Returns:
+            None
+        """
+        slot = idle[0]
+        operator = self.check_operator(slot)
+        if operator is None:
+            return
+
+        # Uploads of the outbox rejected by the traceability system are not recorded, tell the operator.
+        for rejection in slot.kt.take_rejections():
+            popups.ok(f'Resultado no registrado en trazabilidad: {rejection}', background_color='red')
+
+        serial = popups.serial(f'[{slot.name}] Serial:', f'Captura de serial {slot.name}',
+                               interrupt=self.requests_pending)
+        if serial is False:
+            return
+        if serial is None:
+            popups.quick_msg('Cerrando la secuencia', display_sec=5)
+            logger.info('Sequence is closing, waiting for the units under test')
+            self.closing = True
+            return
+        idle.pop(0)
+        slot.loads.put((serial, operator))
+
+    def _run_slot(self, slot):
+        """
+        Runs the units the operator loads in a slot until the station closes.
+
+        Returns:
+            None
+        """
+        logger.debug(f"{slot} started")
+        try:
+            while True:
+                self.idle.put(slot)
+                load = slot.loads.get()
+                if load is None:
+                    break
+                serial, operator = load
+                if serial == "" or not slot.kt.valid_serial(serial, 1):
+                    self.gui(popups.ok, f'[{slot.name}] Serial no valido, vuelva a escanear', background_color='red')
+                    continue
+
+                if not slot.kt.prevalidate(serial):
+                    if slot.kt.prevalidate_failure == "partnumber":
+                        self.gui(popups.ok, f'[{slot.name}] El numero de parte escaneado es incorrecto',
+                                 background_color='red')
+                    else:
+                        self.gui(popups.ok, f'[{slot.name}] {slot.kt.reply_TracMex}', background_color='red')
+                    continue
+
+                self._test_unit(slot, serial, operator)
+                slot.units += 1
+        except Exception as e:
+            logger.exception(f"{slot.name} is closing for exception, {e}")
+            self.gui(popups.quick_msg, f'Cerrando {slot.name} por un error, revisar funcional_log', display_sec=5)
+        logger.debug(f"{slot} ended after {slot.units} units")
+
+    def _test_unit(self, slot, serial, operator):
+        """
+        Powers and tests the DUT of a slot, then writes and sends its result.
+
+        Args:
+            slot (Slot): The slot.
+            serial (str): The DUT serial number.
+            operator (str): The employee number.
+
+        Returns:
+            None
+        """
+        test = slot.test
+        kt = slot.kt
+        test.reset_failure()
+        slot.power_on()
+        try:
+            test.run_tests()
+        finally:
+            slot.power_off()
+        end_time = kt.get_date()
+
+        failstring = ""
+        pass_fail = 1
+        with self.history_lock:
+            self.logfile.add_results_to_logs(kt.part_number, kt.test_start_time, end_time, kt.trace_enable,
+                                             test.is_failure, serial, test.results)
+            self.logfile.add_step_results(serial, kt.test_start_time, test.step_results)
+            if test.is_failure:
+                pass_fail = 0
+                failstring = self.logfile.get_fail_string(test.failure_name, serial)
+        if test.is_failure:
+            self.gui(popups.ok, f'[{slot.name}] UUT fallo en {test.failure_name}', background_color='red')
+
+        if not kt.send_result(pass_fail, failstring, operator, serial_number=serial,
+                              test_start_time=kt.test_start_time, test_end_time=end_time):
+            self.gui(popups.ok, f'[{slot.name}] {kt.replyInsert}', background_color='red')
@@ -0,0 +1,159 @@
+"""
+Benchmark of the report History operations on synthetic day files.
+
+Run from the project folder:
+    python test/bench_report.py --sizes 1000 10000 100000 --output bench_report.json
+"""
+
+import os
+import sys
+import csv
+import json
+import logging
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+
+# Allow running the script from the project folder or from test/.
+parent_path = Path(os.path.dirname(os.path.abspath(__file__))).parent.absolute()
+sys.path.insert(0, str(parent_path))
+os.makedirs(os.path.join(parent_path, "app_log"), exist_ok=True)
+
+import report.report as report
+from report.report import History
+
+
+def percentiles(samples):
+    """
+    Summarizes latency samples.
+
+    Args:
+        samples (list): The latencies in seconds.
+
+    Returns:
+        dict: calls, p50/p90/p99/max in milliseconds and throughput in calls per second.
+    """
+    ordered = sorted(samples)
+    count = len(ordered)
+
+    def pick(q):
+        return ordered[min(count - 1, int(q * count))] * 1000
+
+    return {
+        "calls": count,
+        "p50_ms": pick(0.50),
+        "p90_ms": pick(0.90),
+        "p99_ms": pick(0.99),
+        "max_ms": ordered[-1] * 1000,
+        "throughput_per_s": count / sum(ordered) if sum(ordered) else None}
+
+
+def timed(function, *args, repeat=100):
+    """
+    Calls a function several times and collects the latency of every call.
+
+    Returns:
+        list: The latencies in seconds.
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def make_day_file(history, rows):
+    """
+    Writes a synthetic day file with the real testnames.txt header.
+
+    Args:
+        history (History): The History used to create the header.
+        rows (int): The number of data rows.
+
+    Returns:
+        None
+    """
+    tests = history.limits.test_count
+    with open(history.logfile_path, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        history._write_header(writer)
+        for i in range(rows):
+            results = [random.choice(["True", "False"]) for _ in range(random.randint(1, tests))]
+            results += [""] * (tests - len(results))
+            writer.writerow(["12:00:00", "47752400001+87-A", "2024-02-05 12:00:00", "2024-02-05 12:01:00",
+                             "False", str(results[-1] == "False"), f"{i:030d}"] + results)
+
+
+def bench_size(rows, repeat):
+    """
+    Benchmarks the History operations on a day file of a given size.
+
+    Args:
+        rows (int): The number of data rows of the day file.
+        repeat (int): The calls measured per operation.
+
+    Returns:
+        dict: The latency summary of every operation.
+    """
+    history = History()
+    make_day_file(history, rows)
+    testname = history.limits.testnames[1]
+    results = {}
+
+    results["add_results_to_logs"] = percentiles(timed(
+        history.add_results_to_logs, "47752400001+87-A", "s", "e", False, True, "BENCH", ["True", "False"],
+        repeat=repeat))
+    results["get_fail_string_indexed"] = percentiles(timed(
+        history.get_fail_string, testname, "BENCH", repeat=repeat))
+
+    # A new History has no index, like after a restart: the row is read from the end of the file.
+    cold = History()
+    results["get_fail_string_tail"] = percentiles(timed(
+        cold.get_fail_string, testname, f"{rows // 2:030d}", repeat=max(1, repeat // 10)))
+
+    results["_create_log_existing"] = percentiles(timed(history._create_log, repeat=repeat))
+
+    def create_new():
+        os.remove(history.logfile_path)
+        history._create_log()
+    results["_create_log_new"] = percentiles(timed(create_new, repeat=repeat))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the report History operations.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="Data rows of the synthetic day files.")
+    parser.add_argument("--repeat", type=int, default=200, help="Calls measured per operation.")
+    parser.add_argument("--output", default=None, help="JSON results path, printed if not set.")
+    args = parser.parse_args()
+
+    random.seed(0)
+    # Keep the per call debug logging out of the measurements.
+    logging.getLogger("DUT_logger").setLevel(logging.WARNING)
+    workdir = tempfile.mkdtemp(prefix="bench_report_")
+    # History writes to the module logfiles folder, point it to the temporary folder.
+    report.logfiles_dir = workdir
+    try:
+        results = {"sizes": {}}
+        for rows in args.sizes:
+            results["sizes"][str(rows)] = bench_size(rows, args.repeat)
+            for name, summary in results["sizes"][str(rows)].items():
+                print(f"{rows:>7} rows  {name:<26} p50 {summary['p50_ms']:8.3f} ms  "
+                      f"p99 {summary['p99_ms']:8.3f} ms  {summary['throughput_per_s']:10.1f} /s")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""
+Benchmark of Kimball_Trace against the simulated WSConnector of fake_connector.py.
+
+Run from the project folder:
+    python test/bench_trace.py --units 2000 --latency-ms 20 --error-rate 0.01 --output bench_trace.json
+"""
+
+import os
+import sys
+import json
+import logging
+import time
+import random
+import argparse
+from pathlib import Path
+
+# Allow running the script from the project folder or from test/.
+local_path = os.path.dirname(os.path.abspath(__file__))
+parent_path = Path(local_path).parent.absolute()
+sys.path.insert(0, str(parent_path))
+sys.path.insert(0, local_path)
+os.makedirs(os.path.join(parent_path, "app_log"), exist_ok=True)
+
+from exceptions import TraceabilityError
+from report.kimball import Kimball_Trace
+from fake_connector import FakeConnector, lognormal
+from bench_report import percentiles
+
+
+class Recorder:
+    def __init__(self):
+        """
+        Collects the latency samples and errors of every operation.
+
+        Returns:
+            None
+        """
+        self.samples = {}
+        self.errors = {}
+        self.verdicts = {True: 0, False: 0}
+
+    def call(self, name, function, *args):
+        """
+        Calls a Kimball_Trace method and records its latency; a TraceabilityError counts as an error.
+
+        Returns:
+            The result of the call, None on error.
+        """
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        except TraceabilityError:
+            self.errors[name] = self.errors.get(name, 0) + 1
+            return None
+        finally:
+            self.samples.setdefault(name, []).append(time.perf_counter() - start)
+
+    def summary(self):
+        """
+        Summarizes the latency of every operation.
+
+        Returns:
+            dict: The percentiles and errors by operation.
+        """
+        return {name: dict(percentiles(samples), errors=self.errors.get(name, 0))
+                for name, samples in self.samples.items()}
+
+
+def run_unit(kt, recorder, serial, alternates, sequential=False):
+    """
+    Drives one unit through the traceability calls of functional_test.
+
+    A unit rejected by prevalidate stops there, like in the station, and its latency is
+    recorded as 'rejected_unit'; the units tested and uploaded are recorded as 'unit'.
+
+    Args:
+        kt (Kimball_Trace): The traceability system instance.
+        recorder (Recorder): Collects the latencies.
+        serial (str): The DUT serial number.
+        alternates (list): The [INSERT_CODE] keynames uploaded per unit.
+        sequential (bool, optional): Upload the alternates one call at a time. Defaults to False.
+
+    Returns:
+        bool: True if the unit passed prevalidate and was uploaded.
+    """
+    start = time.perf_counter()
+    verdict = bool(recorder.call("prevalidate", kt.prevalidate, serial))
+    recorder.verdicts[verdict] += 1
+    if not verdict:
+        recorder.samples.setdefault("rejected_unit", []).append(time.perf_counter() - start)
+        return False
+    recorder.call("get_date", kt.get_date)
+    if sequential:
+        for keyname in alternates:
+            recorder.call("send_info_alternate", kt.send_info_alternate, f"{keyname}_{serial}", None, keyname)
+    else:
+        recorder.call("send_info_alternates", kt.send_info_alternates,
+                      {keyname: f"{keyname}_{serial}" for keyname in alternates})
+    recorder.call("send_result", kt.send_result, 1, "", "BENCH")
+    recorder.samples.setdefault("unit", []).append(time.perf_counter() - start)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Kimball_Trace with a simulated connector.")
+    parser.add_argument("--units", type=int, default=1000, help="Simulated units.")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Median latency of every server call.")
+    parser.add_argument("--sigma", type=float, default=0.5, help="Spread of the lognormal latency.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of a connection error per call.")
+    parser.add_argument("--rescan-rate", type=float, default=0.1, help="Probability a unit is scanned again.")
+    parser.add_argument("--sequential-alternates", action="store_true",
+                        help="Upload the alternate identifiers one at a time instead of in bulk.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the simulation.")
+    parser.add_argument("--output", default=None, help="JSON results path, printed if not set.")
+    args = parser.parse_args()
+
+    # Keep the per call logging out of the measurements.
+    logging.getLogger("traceability_logger").setLevel(logging.CRITICAL)
+    random.seed(args.seed)
+
+    connector = FakeConnector(latency=lognormal(args.latency_ms / 1000, args.sigma),
+                              error_rate=args.error_rate, seed=args.seed)
+    kt = Kimball_Trace(connector=connector, trace_enable="on")
+    connector.replies["CIMP_PartNumberRef"] = kt.part_number
+    alternates = [keyname for section, keys in kt.case_settings_lst if section == "INSERT_CODE" for keyname in keys]
+
+    recorder = Recorder()
+    serial = None
+    start = time.perf_counter()
+    try:
+        for i in range(args.units):
+            if serial is None or random.random() >= args.rescan_rate:
+                serial = f"{i:030d}"
+            run_unit(kt, recorder, serial, alternates, args.sequential_alternates)
+    finally:
+        kt.close()
+    elapsed = time.perf_counter() - start
+
+    results = {
+        "units": args.units,
+        "elapsed_s": elapsed,
+        "units_per_s": args.units / elapsed,
+        "prevalidate_passed": recorder.verdicts[True],
+        "prevalidate_rejected": recorder.verdicts[False],
+        "operations": recorder.summary(),
+        "connector_calls": connector.calls,
+        "connector_errors": connector.errors,
+        "partnumber_cache": kt.partnumber_cache.stats(),
+        "trace_stats": kt.trace_stats()}
+    for name, summary in results["operations"].items():
+        print(f"{name:<20} p50 {summary['p50_ms']:8.3f} ms  p99 {summary['p99_ms']:8.3f} ms  "
+              f"max {summary['max_ms']:8.3f} ms  errors {summary['errors']}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
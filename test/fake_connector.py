@@ -0,0 +1,139 @@
+"""
+A pure Python stand-in of WSConnector.dll to exercise Kimball_Trace without the plant network.
+
+    from report.kimball import Kimball_Trace
+    from fake_connector import FakeConnector, lognormal
+
+    connector = FakeConnector(latency=lognormal(0.05, 0.4), error_rate=0.01, part_number="1234567")
+    kt = Kimball_Trace(connector=connector, trace_enable="on")
+"""
+
+import math
+import time
+import random
+from datetime import datetime
+from threading import Lock
+
+# The reply strings of the traceability system that Kimball_Trace checks.
+ERROR_REPLY = "One or more errors occurred."
+
+default_replies = {
+    "CIMP_PartNumberRef": "PART_NUMBER",
+    "BackCheck_Serial": "1|Ok Serial en proceso correcto.",
+    "InsertProcessDataWithFails": "OK | Insertado Correctamente",
+    "Insert_SN_Alternate": "OK",
+    "CIMP_GetDateTimeStr": None,
+}
+
+methods = list(default_replies)
+
+
+def constant(seconds):
+    """
+    A fixed latency.
+
+    Returns:
+        callable: Draws the latency in seconds from a random.Random.
+    """
+    return lambda rng: seconds
+
+
+def uniform(low, high):
+    """
+    A latency uniformly distributed between low and high seconds.
+
+    Returns:
+        callable: Draws the latency in seconds from a random.Random.
+    """
+    return lambda rng: rng.uniform(low, high)
+
+
+def lognormal(median, sigma=0.5):
+    """
+    A long tailed latency, typical of a network round trip.
+
+    Args:
+        median (float): The median latency in seconds.
+        sigma (float, optional): The spread of the underlying normal distribution. Defaults to 0.5.
+
+    Returns:
+        callable: Draws the latency in seconds from a random.Random.
+    """
+    return lambda rng: rng.lognormvariate(math.log(median), sigma)
+
+
+class FakeConnector:
+    def __init__(self, latency=None, error_rate=0.0, replies=None, part_number=None, seed=None):
+        """
+        Initialize a simulated WSConnector.
+
+        Every method sleeps for a latency drawn from its distribution and then answers
+        with its configured reply, or with the connection error reply of the server at
+        the configured error rate.
+
+        Args:
+            latency (callable or dict, optional): A distribution of this module, or a dict of them
+                by method name. Defaults to no latency.
+            error_rate (float or dict, optional): Probability of a connection error reply, or a dict of
+                them by method name. Defaults to 0.
+            replies (dict, optional): Reply string, or callable receiving the call arguments, by method
+                name. Defaults to the success replies.
+            part_number (str, optional): The part number of every serial, the [STATION] part_number for
+                correct DUTs. Defaults to 'PART_NUMBER'.
+            seed (int, optional): Seed of the latency and error draws. Defaults to None.
+
+        Returns:
+            None
+        """
+        self.latency = latency if isinstance(latency, dict) else {method: latency for method in methods}
+        self.error_rate = error_rate if isinstance(error_rate, dict) else {method: error_rate for method in methods}
+        self.replies = dict(default_replies)
+        if part_number is not None:
+            self.replies["CIMP_PartNumberRef"] = part_number
+        self.replies.update(replies or {})
+        self.rng = random.Random(seed)
+        self.lock = Lock()
+        self.calls = {method: 0 for method in methods}
+        self.errors = {method: 0 for method in methods}
+
+    def _call(self, method, *args):
+        """
+        Simulates a round trip to the server.
+
+        Returns:
+            str: The reply, ERROR_REPLY if the connection failed.
+        """
+        with self.lock:
+            distribution = self.latency.get(method)
+            delay = distribution(self.rng) if distribution else 0.0
+            failed = self.rng.random() < self.error_rate.get(method, 0.0)
+            self.calls[method] += 1
+            if failed:
+                self.errors[method] += 1
+        if delay > 0:
+            time.sleep(delay)
+        if failed:
+            return ERROR_REPLY
+        reply = self.replies[method]
+        return reply(*args) if callable(reply) else reply
+
+    def CIMP_PartNumberRef(self, serial_number, option, out):
+        # pythonnet returns the out parameter along with the reply.
+        return self._call("CIMP_PartNumberRef", serial_number, option), out
+
+    def BackCheck_Serial(self, serial_number, station_name):
+        reply = self._call("BackCheck_Serial", serial_number, station_name)
+        return f"0|{ERROR_REPLY}" if reply == ERROR_REPLY else reply
+
+    def InsertProcessDataWithFails(self, serial_number, station_name, process_name,
+                                   start_time, end_time, test_result, fail_string, employee):
+        return self._call("InsertProcessDataWithFails", serial_number, station_name, process_name,
+                          start_time, end_time, test_result, fail_string, employee)
+
+    def Insert_SN_Alternate(self, serial_number, serial_alternate, type_alt, station_name):
+        return self._call("Insert_SN_Alternate", serial_number, serial_alternate, type_alt, station_name)
+
+    def CIMP_GetDateTimeStr(self):
+        # The default reply is the local time in the format of the server.
+        reply = self._call("CIMP_GetDateTimeStr")
+        return reply or datetime.now().strftime("%m/%d/%Y %I:%M:%S %p")
@@ -0,0 +1,128 @@
+"""
+Tests of the test plan compiled from the [TestSequence] of settings.ini by test_plan.py.
+
+Run from the project folder:
+    python test/test_compile_plan.py
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+# Allow running the tests from the project folder or from test/.
+local_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, str(Path(local_path).parent.absolute()))
+
+from test_plan import compile_plan
+from report.limits import LimitTable
+from utilities.settings import parse_settings
+import exceptions
+
+TESTNAMES = """Testname,Low_limit,High_limit,Expected_Value,Unit,Logic_operator
+system_start,True,NA,True,NA,==
+wifi,connected,NA,connected,NA,==
+lcd,True,NA,True,NA,==
+android_verification,11,NA,11,NA,==
+software_verification,8,NA,8,NA,==
+"""
+
+
+class Manager:
+    prompt_steps = ("system_start",)
+
+    def system_start(self):
+        pass
+
+    def wifi(self):
+        pass
+
+    def android_verification(self):
+        pass
+
+    def software_verification(self):
+        pass
+
+    def extra(self):
+        pass
+
+
+class CompilePlanTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.testnames_path = os.path.join(self.folder, "testnames.txt")
+        with open(self.testnames_path, "w") as file:
+            file.write(TESTNAMES)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def settings(self, sequence, sections=""):
+        path = os.path.join(self.folder, "settings.ini")
+        with open(path, "w") as file:
+            file.write("[STATION]\nstation_name = S\nprocess_name = P\npart_number = N\n"
+                       "[PATHS]\nwsconnector_path = W\nnewtonsoftjson_path = J\n"
+                       f"[TestSequence]\nsequence: {sequence}\nstep_timeout = 30\n{sections}")
+        return parse_settings(path)
+
+    def compile(self, sequence, sections="", limits_path=None):
+        return compile_plan(Manager(), self.settings(sequence, sections), LimitTable(limits_path or self.testnames_path))
+
+    def test_plan_of_a_valid_sequence(self):
+        plan = self.compile("system_start,software_verification,wifi",
+                            "[StepDependencies]\nwifi = system_start,lcd\n"
+                            "[StepTimeouts]\nwifi = 5\nsystem_start = 10\n")
+        self.assertEqual(plan.names, ["system_start", "software_verification", "wifi"])
+        self.assertEqual(plan.width, 5)
+        self.assertEqual([step.slot for step in plan.steps], [0, 4, 1])
+        # lcd is not in the sequence, the dependency on it is dropped.
+        self.assertEqual(plan.by_name["wifi"].depends, ("system_start",))
+        self.assertEqual(plan.by_name["wifi"].timeout, 5)
+        self.assertEqual(plan.by_name["software_verification"].timeout, 30)
+        # The operator prompt has no timeout, even one set in [StepTimeouts].
+        self.assertTrue(plan.by_name["system_start"].prompt)
+        self.assertIsNone(plan.by_name["system_start"].timeout)
+
+    def test_every_mismatch_is_listed_at_once(self):
+        with self.assertRaises(exceptions.TestPlanError) as raised:
+            self.compile("system_start,wifi,wifi,lcd,extra,nope")
+        message = str(raised.exception)
+        self.assertIn("wifi is repeated in the sequence", message)
+        self.assertIn("lcd has no test method in Manager", message)
+        self.assertIn(f"extra has no limits in {self.testnames_path}", message)
+        self.assertIn("nope has no test method in Manager", message)
+        self.assertNotIn("system_start", message)
+
+    def test_unreadable_testnames(self):
+        missing = os.path.join(self.folder, "missing.txt")
+        with self.assertRaises(exceptions.TestPlanError) as raised:
+            self.compile("system_start,wifi", limits_path=missing)
+        message = str(raised.exception)
+        self.assertIn(f"{missing} has no tests or cannot be read", message)
+        self.assertIn("system_start has no limits", message)
+        self.assertIn("wifi has no limits", message)
+
+    def test_row_places_values_by_slot(self):
+        plan = self.compile("software_verification,wifi,system_start")
+        # The steps ran out of testnames.txt order and android_verification is not in the sequence.
+        self.assertEqual(plan.row({"system_start": ["True"], "software_verification": ["8"], "wifi": ["connected"]}),
+                         ["True", "connected", "", "", "8"])
+        # A skipped step leaves its slot empty, the values after it keep their columns.
+        self.assertEqual(plan.row({"system_start": ["True"], "wifi": None, "software_verification": ["8"]}),
+                         ["True", "", "", "", "8"])
+        self.assertEqual(plan.row({}), [""] * 5)
+
+    def test_row_of_a_step_recording_several_values(self):
+        plan = self.compile("system_start,android_verification")
+        # android_verification records the software version in the next slot too.
+        self.assertEqual(plan.row({"system_start": ["True"], "android_verification": ["11", "8"]}),
+                         ["True", "", "", "11", "8"])
+        # Values past the last test of testnames.txt are dropped.
+        self.assertEqual(plan.row({"android_verification": ["11", "8", "extra", "more"]}),
+                         ["", "", "", "11", "8"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+"""
+Tests of the durable traceability outbox of report/outbox.py, delivering through
+Kimball_Trace and the simulated WSConnector of fake_connector.py.
+
+Run from the project folder:
+    python test/test_outbox.py
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+# Allow running the tests from the project folder or from test/.
+local_path = os.path.dirname(os.path.abspath(__file__))
+parent_path = Path(local_path).parent.absolute()
+sys.path.insert(0, str(parent_path))
+sys.path.insert(0, local_path)
+os.makedirs(os.path.join(parent_path, "app_log"), exist_ok=True)
+
+from report.kimball import Kimball_Trace
+from report.outbox import TraceOutbox, SENT, PENDING, REJECTED, main
+from fake_connector import FakeConnector, ERROR_REPLY, default_replies
+
+INSERTED = default_replies["InsertProcessDataWithFails"]
+
+
+def payload(serial, start_time="10/18/2026 08:00:00 AM"):
+    return {"serial_number": serial,
+            "station_name": "STATION",
+            "process_name": "PROCESS",
+            "test_start_time": start_time,
+            "test_end_time": "10/18/2026 08:05:00 AM",
+            "test_result": 1,
+            "fail_string": "",
+            "employee": "E1"}
+
+
+def wait_for(condition, timeout=5.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+class TraceOutboxTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "outbox.db")
+        # The serials in the order the server received them, and the reply of each call.
+        self.received = []
+        self.replies = []
+        self.connector = FakeConnector(replies={"InsertProcessDataWithFails": self.insert})
+        self.kt = Kimball_Trace(connector=self.connector, trace_enable="on")
+        self.outboxes = []
+
+    def tearDown(self):
+        for outbox in self.outboxes:
+            outbox.close()
+        self.kt.close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def insert(self, serial_number, *args):
+        reply = self.replies.pop(0) if self.replies else INSERTED
+        if reply != ERROR_REPLY:
+            self.received.append(serial_number)
+        return reply
+
+    def open_outbox(self, base_backoff=0.01):
+        outbox = TraceOutbox({"result": self.kt._deliver_result}, path=self.path,
+                             base_backoff=base_backoff, max_backoff=0.1)
+        self.outboxes.append(outbox)
+        return outbox
+
+    def close_outbox(self, outbox):
+        outbox.close()
+        self.outboxes.remove(outbox)
+
+    def status(self, outbox, record_id):
+        with outbox.lock:
+            return outbox.connection.execute("SELECT status, attempts FROM records WHERE id = ?",
+                                             (record_id,)).fetchone()
+
+    def test_duplicate_serial_and_start_time_is_ignored(self):
+        outbox = self.open_outbox()
+        self.assertTrue(outbox.add("result", "result|S1|08:00", payload("S1")))
+        self.assertFalse(outbox.add("result", "result|S1|08:00", payload("S1")))
+        # A retest of the serial has another start time.
+        self.assertTrue(outbox.add("result", "result|S1|09:00", payload("S1", "09:00")))
+        self.assertTrue(wait_for(lambda: outbox.pending_count() == 0))
+        self.assertEqual(self.received, ["S1", "S1"])
+
+    def test_records_are_delivered_in_order(self):
+        outbox = self.open_outbox()
+        serials = [f"S{number}" for number in range(20)]
+        for serial in serials:
+            outbox.add("result", f"result|{serial}", payload(serial))
+        self.assertTrue(wait_for(lambda: outbox.pending_count() == 0))
+        self.assertEqual(self.received, serials)
+
+    def test_connection_errors_back_off_and_hold_later_records(self):
+        self.replies = [ERROR_REPLY, ERROR_REPLY, ERROR_REPLY]
+        outbox = self.open_outbox(base_backoff=0.05)
+        start = time.monotonic()
+        outbox.add("result", "result|S1", payload("S1"))
+        outbox.add("result", "result|S2", payload("S2"))
+        self.assertTrue(wait_for(lambda: outbox.pending_count() == 0))
+        # Three retries wait 0.05, 0.1 and 0.1 s (max_backoff).
+        self.assertGreaterEqual(time.monotonic() - start, 0.25)
+        self.assertEqual(self.received, ["S1", "S2"])
+        self.assertEqual(tuple(self.status(outbox, 1)), (SENT, 4))
+        self.assertEqual(tuple(self.status(outbox, 2)), (SENT, 1))
+
+    def test_rejections_are_kept_for_the_operator(self):
+        self.replies = ["Error | Serial fuera de ruta"]
+        outbox = self.open_outbox()
+        outbox.add("result", "result|S1", payload("S1"))
+        outbox.add("result", "result|S2", payload("S2"))
+        self.assertTrue(wait_for(lambda: outbox.pending_count() == 0))
+        # A rejection does not hold back the records after it.
+        self.assertEqual(self.received, ["S1", "S2"])
+        self.assertEqual(self.status(outbox, 1)["status"], REJECTED)
+
+        rejections = outbox.take_rejections()
+        self.assertEqual([(record["id"], record["reply"]) for record in rejections],
+                         [(1, "Error | Serial fuera de ruta")])
+        self.assertEqual(rejections[0]["payload"]["serial_number"], "S1")
+        self.assertEqual(outbox.take_rejections(), [])
+        self.assertEqual([record["id"] for record in outbox.rejected()], [1])
+
+    def test_kimball_take_rejections_messages(self):
+        self.replies = ["Error | Serial fuera de ruta"]
+        self.kt.outbox = outbox = self.open_outbox()
+        try:
+            outbox.add("result", "result|S1", payload("S1"))
+            self.assertTrue(wait_for(lambda: outbox.pending_count() == 0))
+            self.assertEqual(self.kt.take_rejections(), ["S1 (result #1): Error | Serial fuera de ruta"])
+        finally:
+            self.kt.outbox = None
+
+    def test_pending_records_are_delivered_after_a_restart(self):
+        self.replies = [ERROR_REPLY] * 100
+        outbox = self.open_outbox(base_backoff=10)
+        outbox.add("result", "result|S1", payload("S1"))
+        outbox.add("result", "result|S2", payload("S2"))
+        self.assertTrue(wait_for(lambda: self.status(outbox, 1)["attempts"] == 1))
+        self.close_outbox(outbox)
+
+        self.replies = []
+        outbox = self.open_outbox()
+        self.assertTrue(wait_for(lambda: outbox.pending_count() == 0))
+        self.assertEqual(self.received, ["S1", "S2"])
+        # The journal keeps the key, the same upload is not queued twice after the restart.
+        self.assertFalse(outbox.add("result", "result|S1", payload("S1")))
+
+    def test_replay_of_a_rejected_record_after_a_restart(self):
+        self.replies = ["Error | Serial fuera de ruta"]
+        outbox = self.open_outbox()
+        outbox.add("result", "result|S1", payload("S1"))
+        self.assertTrue(wait_for(lambda: self.status(outbox, 1)["status"] == REJECTED))
+        self.close_outbox(outbox)
+
+        outbox = self.open_outbox()
+        self.assertEqual([record["id"] for record in outbox.rejected()], [1])
+        self.assertFalse(outbox.replay(2))
+        self.assertTrue(outbox.replay(1))
+        self.assertTrue(wait_for(lambda: self.status(outbox, 1)["status"] == SENT))
+        self.assertEqual(self.received, ["S1", "S1"])
+        self.assertEqual(outbox.rejected(), [])
+
+    def test_replay_from_the_command_line(self):
+        self.replies = ["Error | Serial fuera de ruta"]
+        outbox = self.open_outbox()
+        outbox.add("result", "result|S1", payload("S1"))
+        self.assertTrue(wait_for(lambda: self.status(outbox, 1)["status"] == REJECTED))
+
+        self.assertEqual(main(["replay", "1", "--path", self.path]), 0)
+        self.assertEqual(main(["replay", "1", "--path", self.path]), 1)
+        self.assertEqual(self.status(outbox, 1)["status"], PENDING)
+        # The drainer checks the journal every minute, wake it instead of waiting.
+        outbox.wake.set()
+        self.assertTrue(wait_for(lambda: self.status(outbox, 1)["status"] == SENT))
+
+
+if __name__ == '__main__':
+    unittest.main()
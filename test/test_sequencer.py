@@ -0,0 +1,108 @@
+"""
+Tests of the dependency graph engine of sequencer.py.
+
+Run from the project folder:
+    python test/test_sequencer.py
+"""
+
+import os
+import sys
+import time
+import threading
+import unittest
+from pathlib import Path
+
+# Allow running the tests from the project folder or from test/.
+local_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, str(Path(local_path).parent.absolute()))
+
+from sequencer import Step, SequenceEngine
+
+
+def sleeper(seconds, log=None, name=None):
+    def step():
+        if log is not None:
+            log.append((name, "start", time.monotonic()))
+        time.sleep(seconds)
+        if log is not None:
+            log.append((name, "end", time.monotonic()))
+    return step
+
+
+class SequenceEngineTest(unittest.TestCase):
+    def test_unknown_dependency(self):
+        with self.assertRaises(ValueError):
+            SequenceEngine([Step("a", sleeper(0), depends=["missing"])])
+
+    def test_cycle(self):
+        steps = [Step("a", sleeper(0), depends=["c"]),
+                 Step("b", sleeper(0), depends=["a"]),
+                 Step("c", sleeper(0), depends=["b"])]
+        with self.assertRaisesRegex(ValueError, "cycle"):
+            SequenceEngine(steps)
+
+    def test_dependencies_order(self):
+        engine = SequenceEngine([Step("b", sleeper(0.01), depends=["a"]),
+                                 Step("a", sleeper(0.05)),
+                                 Step("c", sleeper(0), depends=["b"])])
+        self.assertEqual(engine.run(), ["a", "b", "c"])
+
+    def test_independent_steps_overlap(self):
+        engine = SequenceEngine([Step(name, sleeper(0.2)) for name in "abc"], max_workers=3)
+        start = time.monotonic()
+        engine.run()
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_resource_exclusion(self):
+        log = []
+        engine = SequenceEngine([Step("a", sleeper(0.1, log, "a"), resources=["adb"]),
+                                 Step("b", sleeper(0.1, log, "b"), resources=["adb"]),
+                                 Step("c", sleeper(0.1, log, "c"), resources=["modem"])], max_workers=3)
+        engine.run()
+        times = {(name, event): at for name, event, at in log}
+        # a and b share the adb, one starts after the other ends; c overlaps them.
+        self.assertGreaterEqual(times[("b", "start")], times[("a", "end")])
+        self.assertLess(times[("c", "start")], times[("a", "end")])
+
+    def test_fail_fast_skips_pending_steps(self):
+        failed = threading.Event()
+        steps = [Step("a", failed.set),
+                 Step("b", sleeper(0), depends=["a"]),
+                 Step("c", sleeper(0), depends=["b"])]
+        engine = SequenceEngine(steps)
+        self.assertEqual(engine.run(should_stop=failed.is_set), ["a"])
+        self.assertEqual(engine.skipped, ["b", "c"])
+
+    def test_exception_stops_and_is_raised(self):
+        def broken():
+            raise RuntimeError("DUT not found")
+        engine = SequenceEngine([Step("a", broken), Step("b", sleeper(0), depends=["a"])])
+        with self.assertRaisesRegex(RuntimeError, "DUT not found"):
+            engine.run()
+        self.assertEqual(engine.skipped, ["b"])
+
+    def test_timeout_abandons_step(self):
+        engine = SequenceEngine([Step("slow", sleeper(1.0), timeout=0.1),
+                                 Step("next", sleeper(0), depends=["slow"])])
+        start = time.monotonic()
+        completed = engine.run()
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(completed, [])
+        self.assertEqual(engine.timed_out, ["slow"])
+        self.assertEqual(engine.skipped, ["next"])
+
+    def test_inline_steps_run_on_calling_thread(self):
+        threads = {}
+
+        def record(name):
+            return lambda: threads.setdefault(name, threading.get_ident())
+        engine = SequenceEngine([Step("prompt", record("prompt"), inline=True, timeout=0.01),
+                                 Step("pool", record("pool"), depends=["prompt"])])
+        self.assertEqual(engine.run(), ["prompt", "pool"])
+        self.assertEqual(threads["prompt"], threading.get_ident())
+        self.assertNotEqual(threads["pool"], threading.get_ident())
+        self.assertIsNone(engine.steps["prompt"].timeout)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+"""
+Tests of the step statistics and the adaptive step order of report/step_stats.py.
+
+Run from the project folder:
+    python test/test_step_stats.py
+"""
+
+import os
+import sys
+import unittest
+from pathlib import Path
+
+# Allow running the tests from the project folder or from test/.
+local_path = os.path.dirname(os.path.abspath(__file__))
+parent_path = Path(local_path).parent.absolute()
+sys.path.insert(0, str(parent_path))
+os.makedirs(os.path.join(parent_path, "app_log"), exist_ok=True)
+
+from report.step_stats import StepStatistics
+
+
+def runs(stats, name, duration, fails, total=20):
+    # The failed runs first, then the passed ones.
+    for number in range(total):
+        stats.add(name, duration, number >= fails)
+
+
+class StepStatisticsTest(unittest.TestCase):
+    def setUp(self):
+        self.stats = StepStatistics(window=20)
+        # Median seconds / failure probability with the Laplace prior (fails + 1) / (20 + 2):
+        # slow 100 / (1/22) = 2200, flaky 10 / (11/22) = 20, quick 1 / (2/22) = 11.
+        runs(self.stats, "slow", 100.0, 0)
+        runs(self.stats, "flaky", 10.0, 10)
+        runs(self.stats, "quick", 1.0, 1)
+
+    def test_independent_steps_by_ratio(self):
+        self.assertEqual(self.stats.order(["slow", "flaky", "quick"]), ["quick", "flaky", "slow"])
+
+    def test_dependencies_always_hold(self):
+        depends = {"quick": ["slow"]}
+        self.assertEqual(self.stats.order(["slow", "flaky", "quick"], depends), ["flaky", "slow", "quick"])
+        # A dependency on a step out of the sequence does not hold the step back.
+        depends = {"quick": ["missing"]}
+        self.assertEqual(self.stats.order(["slow", "flaky", "quick"], depends), ["quick", "flaky", "slow"])
+
+    def test_sequence_order_until_min_runs(self):
+        runs(self.stats, "new", 0.1, 5, total=5)
+        self.assertEqual(self.stats.order(["slow", "new", "quick"]), ["slow", "new", "quick"])
+        self.assertEqual(self.stats.order(["slow", "new", "quick"], min_runs=5), ["new", "quick", "slow"])
+        # A step with no history keeps the sequence order too.
+        self.assertEqual(self.stats.order(["slow", "unknown", "quick"]), ["slow", "unknown", "quick"])
+
+    def test_steps_with_no_duration_keep_the_sequence_order(self):
+        runs(self.stats, "untimed", None, 5)
+        self.assertEqual(self.stats.order(["slow", "untimed", "quick"]), ["slow", "untimed", "quick"])
+
+    def test_old_runs_leave_the_window(self):
+        summary = self.stats.summary()["flaky"]
+        self.assertEqual((summary["runs"], summary["fails"]), (20, 10))
+        # 15 passed runs push out the 10 failed ones and 5 passed ones.
+        runs(self.stats, "flaky", 10.0, 0, total=15)
+        summary = self.stats.summary()["flaky"]
+        self.assertEqual((summary["runs"], summary["fails"]), (20, 0))
+        self.assertAlmostEqual(summary["failure_probability"], 1 / 22)
+        self.assertEqual(self.stats.order(["slow", "flaky", "quick"]), ["quick", "flaky", "slow"])
+        runs(self.stats, "flaky", 1000.0, 0, total=20)
+        self.assertEqual(self.stats.order(["slow", "flaky", "quick"]), ["quick", "slow", "flaky"])
+
+    def test_dependency_cycle_keeps_the_sequence_order(self):
+        depends = {"slow": ["flaky"], "flaky": ["slow"]}
+        self.assertEqual(self.stats.order(["slow", "flaky", "quick"], depends), ["quick", "slow", "flaky"])
+
+    def test_load_of_the_steps_file_strings(self):
+        stats = StepStatistics(window=20)
+        stats.load([("wifi", "1.5", "True"), ("wifi", "", "False"), ("wifi", "bad", "True")])
+        summary = stats.summary()["wifi"]
+        self.assertEqual((summary["runs"], summary["fails"], summary["median_duration"]), (3, 1, 1.5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,12 +4,17 @@ cases executed.
 """
 import os
 from pathlib import Path
-from configparser import ConfigParser
 from datetime import datetime, timedelta
+from threading import Lock, local
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import time
 from gui import popups
 import logger as log
 from communication.adb import Adb
-from utilities.utilities import get_value_ini
+from utilities.settings import get_settings
+from sequencer import Step, StepResult, SequenceEngine
+from report.limits import LimitTable, LimitEngine
+from test_plan import compile_plan
 
 # Paths to folders relative to this py file.
 local_path = os.path.dirname(os.path.abspath(__file__))
@@ -26,43 +31,89 @@ logger = log.make_logger(
     logger_name="test_logger"
 )
 
-test_list = "settings\settings.ini"
-test_path = os.path.join(local_path, test_list)
-
 class TestManager:
-    def __init__(self, mode, settings_lst):
+    # Steps opening operator windows; the GUI is not thread safe, they run on the thread of the sequence.
+    prompt_steps = ("system_start",)
+
+    def __init__(self, mode, settings_lst, target=None, step_stats=None):
         logger.debug(f"Initializing {__class__.__name__}")
         self.mode = mode
         self.settings_lst = settings_lst
-        self.config = ConfigParser()
-        self.config.read(test_path)
+        # The ADB target (IP or serial) of the DUT in a multi-slot station, None for the only DUT.
+        self.target = target
+        self.adb = Adb(target)
+        # The StepStatistics of the history, used by the adaptive step ordering.
+        self.step_stats = step_stats
+        # Opens the operator windows of the steps; a runner driving the steps off the GUI thread replaces it.
+        self.gui = lambda function, *args, **kwargs: function(*args, **kwargs)
+        # Scans the DUT network once the unit is on (utilities.ping.scan_ip); a single DUT station sets it.
+        self.network_scan = None
+        self.fail_lock = Lock()
+        # Steps running on the sequencer threads append their results to a buffer of their own.
+        self.step_buffer = local()
         self.reset_failure()
+        # The sequence is compiled and checked once; a mismatch raises TestPlanError here.
+        self.limits = LimitTable()
+        # The limits of testnames.txt decide the verdict of every step and of the unit.
+        self.limit_engine = LimitEngine(self.limits)
+        self.plan = compile_plan(self, get_settings(), self.limits)
+
+    @property
+    def results(self):
+        buffer = getattr(self.step_buffer, "results", None)
+        return self._results if buffer is None else buffer
+
+    @results.setter
+    def results(self, results):
+        self._results = results
 
     def reset_failure(self):
         self.is_failure = False
         self.failure_name = None
         self.results = []
+        # The token of the unit; a step abandoned on timeout that ends during a later unit is ignored.
+        self.run_token = object()
+        # StepResult records of the last run, in the order chosen for the unit.
+        self.step_results = []
+        self.step_records = {}
+        self.step_order = []
         
     def set_fail(self, is_fail, failure):
-        self.is_failure = is_fail
-        self.failure_name = failure
+        # A step abandoned on timeout keeps running, it must not fail the unit tested after it.
+        token = getattr(self.step_buffer, "token", None)
+        if token is not None and token is not self.run_token:
+            logger.warning(f"Run_Test: {failure} of a previous unit failed after its timeout, ignored")
+            return
+        # With steps running at once, the first failure is the one reported.
+        with self.fail_lock:
+            if is_fail and self.is_failure:
+                return
+            self.is_failure = is_fail
+            self.failure_name = failure
         
-    def check_operator(self, operator, last_scan_time, timeout_minutes=30):
+    def check_operator(self, operator, last_scan_time, timeout_minutes=30, interrupt=None):
         current_time = datetime.now()
 
         if operator is None or (current_time - last_scan_time) > timedelta(minutes=timeout_minutes):
-            operator = popups.serial('Numero de empleado:', 'Captura de empleado')
+            # An interrupted prompt returns False, see popups.serial.
+            operator = popups.serial('Numero de empleado:', 'Captura de empleado', interrupt=interrupt)
         return operator, current_time
 
     def system_start(self):
-        reply_window = popups.image_yes_no('¿Se muestra esta pantalla?', get_value_ini(self.settings_lst, 'path_image_1'), 'Power_On')
+        reply_window = self.gui(popups.image_yes_no, '¿Se muestra esta pantalla?', get_settings().PATHS.path_image_1, 'Power_On')
         if reply_window == "Yes":
             result = "True"
             is_complete = True
+            # Only one UUT may be powered on the network of a single DUT station.
+            if self.network_scan is not None and len(self.network_scan()) > 1:
+                self.gui(popups.ok, 'Se ha detectado dos UUT encendidas\n'
+                         'apague la que no esta usando', background_color='red')
+                result = "False"
+                logger.debug("Two UUT powered on the network")
+                is_complete = False
         if reply_window == "No":
             result = "False"
             logger.debug("UUT no power On")
-            self.set_fail(True, "system_start")
             # popups.ok('Unidad no enciendo, entregar a analisis', background_color= 'red')
             is_complete = False
         self.results.append(result)
@@ -83,11 +134,209 @@ class TestManager:
         print("Ejecutando VDU_config")
 
     def run_tests(self):
-        test_sequence = self.config.get('TestSequence', 'sequence').split(',')
-        for test_name in test_sequence:
-            test_method_name = test_name.strip()
-            if hasattr(self, test_method_name):
-                getattr(self, test_method_name)()
+        # A sequence edited in settings.ini is compiled again and applies to the next unit.
+        settings = get_settings()
+        plan = self._get_plan(settings)
+        if settings.TestSequence.engine == "dag":
+            return self.run_tests_dag(settings, plan)
+        buffers = {}
+        try:
+            for step in self._order_steps(settings, plan):
+                buffers[step.name] = self._run_step(step)
                 if self.is_failure:
-                    logger.debug(f"Run_Test: Sequence is failure in {test_name} test")
-                    break
\ No newline at end of file
+                    logger.debug(f"Run_Test: Sequence is failure in {step.name} test")
+                    break
+        finally:
+            self.results = plan.row(buffers)
+            self._evaluate_results()
+            self._collect_step_results()
+
+    def _get_plan(self, settings):
+        """
+        Gets the compiled plan, compiled again if settings.ini or testnames.txt changed.
+
+        Args:
+            settings (Settings): The current settings.
+
+        Returns:
+            TestPlan: The plan of the unit.
+
+        Raises:
+            TestPlanError: If the changed sequence does not match the test methods or testnames.txt.
+        """
+        if not self.plan.is_current(settings, self.limits):
+            self.plan = compile_plan(self, settings, self.limits)
+        return self.plan
+
+    def _order_steps(self, settings, plan):
+        """
+        Chooses the order of the steps of a unit and keeps their names in self.step_order.
+
+        With [TestSequence] ordering = adaptive, the steps run cheapest and most likely to fail
+        first, by the step statistics of the history; [StepDependencies] always hold.
+
+        Args:
+            settings (Settings): The current settings.
+            plan (TestPlan): The plan of the unit.
+
+        Returns:
+            list: The PlanStep objects in the order to run them.
+        """
+        order = plan.names
+        if settings.TestSequence.ordering == "adaptive" and self.step_stats is not None:
+            order = self.step_stats.order(plan.names, {step.name: step.depends for step in plan.steps},
+                                          settings.TestSequence.ordering_min_runs)
+            if order != plan.names:
+                logger.debug(f"Run_Test: adaptive step order {order}")
+        self.step_order = list(order)
+        return [plan.by_name[name] for name in order]
+
+    def _bind_step(self, step, buffer):
+        """
+        Wraps a step method to time it and record its StepResult; the results it appends go to buffer.
+
+        The records and the run token of the unit are taken when the step is bound, so a step
+        abandoned on timeout that ends during a later unit does not write into its records.
+
+        Args:
+            step (PlanStep): The compiled step.
+            buffer (list): Receives the values the step appends to self.results.
+
+        Returns:
+            callable: The wrapped step.
+        """
+        name = step.name
+        function = step.function
+        slot = step.slot
+        records = self.step_records
+        token = self.run_token
+
+        def run_step():
+            record = StepResult(name, start=time.monotonic())
+            self.step_buffer.results = buffer
+            self.step_buffer.token = token
+            try:
+                function()
+            except Exception as e:
+                record.error = repr(e)
+                raise
+            finally:
+                self.step_buffer.results = None
+                self.step_buffer.token = None
+                record.end = time.monotonic()
+                record.measurement = ";".join(str(value) for value in buffer)
+                if token is not self.run_token:
+                    logger.warning(f"Run_Test: {name} of a previous unit ended after its timeout, ignored")
+                else:
+                    # The limits of testnames.txt decide the verdict of the values the step recorded.
+                    evaluation = self.limit_engine.evaluate(buffer, start=slot)
+                    if not evaluation.passed:
+                        self.set_fail(True, evaluation.failing_step)
+                    with self.fail_lock:
+                        record.verdict = record.error is None and evaluation.passed and self.failure_name != name
+                        # A step abandoned on timeout keeps its timeout record.
+                        records.setdefault(name, record)
+        return run_step
+
+    def _timed_out(self, name, start, timeout):
+        """
+        Records a step that did not end in time and fails the unit.
+
+        Returns:
+            None
+        """
+        logger.error(f"Run_Test: {name} did not end in {timeout} s")
+        with self.fail_lock:
+            self.step_records[name] = StepResult(name, start, time.monotonic(), verdict=False,
+                                                 error=f"Timeout after {timeout} s")
+        self.set_fail(True, name)
+
+    def _run_step(self, step):
+        """
+        Runs a step of the serial sequence; a step with a timeout runs on a worker thread.
+
+        Args:
+            step (PlanStep): The compiled step.
+
+        Returns:
+            list: The values the step recorded, None if it timed out.
+        """
+        buffer = []
+        run_step = self._bind_step(step, buffer)
+        name = step.name
+        timeout = step.timeout
+        if timeout is None:
+            run_step()
+        else:
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="step")
+            start = time.monotonic()
+            try:
+                executor.submit(run_step).result(timeout=timeout)
+            except FutureTimeoutError:
+                self._timed_out(name, start, timeout)
+                return None
+            finally:
+                executor.shutdown(wait=False)
+        return buffer
+
+    def _evaluate_results(self):
+        """
+        Evaluates the results of the unit against the limits of testnames.txt; the first test out of
+        its limits fails the unit. A step that raised or timed out keeps its failure.
+
+        Returns:
+            Evaluation: The verdict per testname, the overall result and the first step that failed.
+        """
+        evaluation = self.limit_engine.evaluate(self.results)
+        if not evaluation.passed:
+            self.set_fail(True, evaluation.failing_step)
+        return evaluation
+
+    def _collect_step_results(self):
+        """
+        Orders the StepResult records of the run by the order chosen for the unit and numbers them.
+
+        Returns:
+            None
+        """
+        with self.fail_lock:
+            self.step_results = []
+            for position, name in enumerate(self.step_order, 1):
+                if name in self.step_records:
+                    self.step_records[name].position = position
+                    self.step_results.append(self.step_records[name])
+
+    def run_tests_dag(self, settings, plan):
+        """
+        Runs the sequence as a dependency graph; independent steps overlap.
+
+        Dependencies come from [StepDependencies] and exclusive DUT resources from [StepResources],
+        both as comma separated lists by step name. Ready steps start in the order chosen by
+        _order_steps and every value goes to the result slot of its step.
+
+        Args:
+            settings (Settings): The current settings.
+            plan (TestPlan): The plan of the unit.
+
+        Returns:
+            None
+        """
+        buffers = {name: [] for name in plan.names}
+        steps = [Step(step.name, self._bind_step(step, buffers[step.name]),
+                      depends=step.depends, resources=step.resources, timeout=step.timeout, inline=step.prompt)
+                 for step in self._order_steps(settings, plan)]
+        engine = SequenceEngine(steps, max_workers=settings.TestSequence.max_parallel)
+        try:
+            engine.run(should_stop=lambda: self.is_failure)
+        finally:
+            for step in steps:
+                if step.name in engine.timed_out:
+                    self._timed_out(step.name, engine.started_at[step.name], step.timeout)
+            for name in engine.timed_out:
+                buffers.pop(name)
+            self.results = plan.row(buffers)
+            self._evaluate_results()
+            self._collect_step_results()
+            if self.is_failure:
+                logger.debug(f"Run_Test: Sequence is failure in {self.failure_name} test, "
+                             f"not started: {engine.skipped}")
@@ -0,0 +1,151 @@
+"""
+The test_plan compiles the [TestSequence] of settings.ini into a plan checked against the test
+methods and testnames.txt, so a misnamed step stops the station instead of being skipped.
+"""
+import logging
+from report.limits import INFO_COLUMNS
+from exceptions import TestPlanError
+
+logger = logging.getLogger("test_logger")
+
+
+class PlanStep:
+    def __init__(self, name, function, slot, depends=(), resources=(), timeout=None, prompt=False):
+        """
+        Initialize a compiled step of the plan.
+
+        Args:
+            name (str): The step name.
+            function (callable): The bound test method.
+            slot (int): The index of the step value in the results of a unit, from its testnames.txt column.
+            depends (iterable, optional): Names of the steps of the plan that must end before this one. Defaults to ().
+            resources (iterable, optional): DUT resources used exclusively by the step. Defaults to ().
+            timeout (float, optional): Seconds the step may run. Defaults to None (no limit).
+            prompt (bool, optional): The step opens operator windows and runs on the thread of the
+                sequence. Defaults to False.
+
+        Returns:
+            None
+        """
+        self.name = name
+        self.function = function
+        self.slot = slot
+        self.depends = tuple(depends)
+        self.resources = tuple(resources)
+        self.timeout = timeout or None
+        self.prompt = prompt
+
+    def __repr__(self):
+        return (f"PlanStep({self.name!r}, slot={self.slot}, depends={self.depends}, timeout={self.timeout}, "
+                f"prompt={self.prompt})")
+
+
+class TestPlan:
+    def __init__(self, steps, width, settings=None, limits_mtime=None):
+        """
+        Initialize a compiled plan.
+
+        Args:
+            steps (list): The PlanStep objects, in sequence order.
+            width (int): The number of results of a unit, one per test of testnames.txt.
+            settings (Settings, optional): The settings the plan was compiled from. Defaults to None.
+            limits_mtime (float, optional): The mtime of the testnames.txt compiled. Defaults to None.
+
+        Returns:
+            None
+        """
+        self.steps = steps
+        self.by_name = {step.name: step for step in steps}
+        self.names = [step.name for step in steps]
+        self.width = width
+        self.settings = settings
+        self.limits_mtime = limits_mtime
+
+    def is_current(self, settings, limits):
+        """
+        Checks the plan was compiled from these settings and the current testnames.txt.
+
+        Args:
+            settings (Settings): The current settings; a reloaded settings.ini is a new object.
+            limits (LimitTable): The limit table, reloaded if its file changed.
+
+        Returns:
+            bool: True if the plan is still valid.
+        """
+        limits.reload()
+        return self.settings is settings and self.limits_mtime == limits.mtime
+
+    def row(self, buffers):
+        """
+        Places the values recorded by the steps in their result slots.
+
+        A step that records several values fills the slots after its own. The slots of the
+        steps that did not run stay empty, so every value lines up with its testnames.txt column.
+
+        Args:
+            buffers (dict): The values recorded by each step, by name; None or missing if it did not run.
+
+        Returns:
+            list: The results of the unit, one per test of testnames.txt.
+        """
+        row = [""] * self.width
+        for step in self.steps:
+            values = buffers.get(step.name)
+            if values:
+                row[step.slot:step.slot + len(values)] = values[:self.width - step.slot]
+        return row
+
+
+def compile_plan(manager, settings, limits):
+    """
+    Compiles the sequence of the settings into a plan, checking every step at once.
+
+    Args:
+        manager (TestManager): The test manager whose methods run the steps.
+        settings (Settings): The current settings.
+        limits (LimitTable): The limit table of testnames.txt.
+
+    Returns:
+        TestPlan: The compiled plan.
+
+    Raises:
+        TestPlanError: If a step has no test method, is not in testnames.txt or is repeated, listing every mismatch.
+    """
+    limits.reload()
+    dependencies = settings.get_section("StepDependencies")
+    resources = settings.get_section("StepResources")
+    timeouts = settings.get_section("StepTimeouts")
+    sequence = settings.TestSequence.sequence
+
+    errors = []
+    if not limits.test_count:
+        errors.append(f"{limits.path} has no tests or cannot be read")
+    prompt_steps = getattr(manager, "prompt_steps", ())
+    steps = []
+    for name in sequence:
+        function = getattr(manager, name, None)
+        column = limits.column_index.get(name)
+        if name in [step.name for step in steps]:
+            errors.append(f"{name} is repeated in the sequence")
+        elif not callable(function):
+            errors.append(f"{name} has no test method in {type(manager).__name__}")
+        elif column is None:
+            errors.append(f"{name} has no limits in {limits.path}")
+        else:
+            prompt = name in prompt_steps
+            timeout = timeouts.get(name, settings.TestSequence.step_timeout)
+            # A timeout cannot close an operator window, the prompting steps wait for the operator.
+            if prompt:
+                if name in timeouts:
+                    logger.warning(f"{name} waits for the operator, its timeout in [StepTimeouts] is not applied.")
+                timeout = None
+            steps.append(PlanStep(name, function, column - INFO_COLUMNS,
+                                  depends=[dependency for dependency in dependencies.get(name, []) if dependency in sequence],
+                                  resources=resources.get(name, []),
+                                  timeout=timeout,
+                                  prompt=prompt))
+    if errors:
+        raise TestPlanError("The test sequence of settings.ini is not valid:\n" + "\n".join(errors))
+
+    logger.debug(f"Test plan compiled: {[(step.name, step.slot) for step in steps]}")
+    return TestPlan(steps, limits.test_count, settings, limits.mtime)
@@ -0,0 +1,331 @@
+"""
+The settings module parses settings/settings.ini once into a read only, typed object shared by
+every module, and reloads it when the file changes.
+"""
+
+import os
+import time
+import logging
+from collections.abc import Mapping
+from configparser import ConfigParser, Error as ConfigParserError
+from pathlib import Path
+from threading import Lock
+from exceptions import SettingsError
+
+logger = logging.getLogger('utilities_logger')
+
+# Paths to folders relative to this py file.
+local_path = os.path.dirname(os.path.abspath(__file__))
+parent_path = Path(local_path).parent.absolute()
+settings_path = os.path.join(parent_path, 'settings', 'settings.ini')
+
+ON_OFF = ("on", "off")
+
+# Type, default and allowed values by (section, key). Keys not listed are kept as strings.
+# A default of None marks a required key.
+schema = {
+    ("OPTIONS", "trace_enable"): (str, "off", ON_OFF),
+    ("OPTIONS", "mode"): (str, "manual", ("manual", "auto")),
+    ("OPTIONS", "runner"): (str, "sync", ("sync", "async")),
+    ("OPTIONS", "slots"): (int, 1, None),
+    ("OPTIONS", "trace_workers"): (int, 4, None),
+    ("OPTIONS", "trace_timeout"): (float, 30.0, None),
+    ("OPTIONS", "clock_resync_minutes"): (float, 60.0, None),
+    ("OPTIONS", "clock_max_drift_seconds"): (float, 2.0, None),
+    ("OPTIONS", "outbox"): (str, "off", ON_OFF),
+    ("OPTIONS", "partnumber_cache_size"): (int, 256, None),
+    ("OPTIONS", "partnumber_cache_ttl"): (float, 600.0, None),
+    ("OPTIONS", "alternate_workers"): (int, 9, None),
+    ("OPTIONS", "breaker_failures"): (int, 5, None),
+    ("OPTIONS", "breaker_reset_seconds"): (float, 30.0, None),
+    ("STATION", "station_name"): (str, None, None),
+    ("STATION", "process_name"): (str, None, None),
+    ("STATION", "part_number"): (str, None, None),
+    ("TestSequence", "sequence"): (list, None, None),
+    ("TestSequence", "engine"): (str, "serial", ("serial", "dag")),
+    ("TestSequence", "max_parallel"): (int, 3, None),
+    ("TestSequence", "step_timeout"): (float, 0.0, None),
+    ("TestSequence", "ordering"): (str, "fixed", ("fixed", "adaptive")),
+    ("TestSequence", "ordering_min_runs"): (int, 20, None),
+    ("TestSequence", "ordering_window"): (int, 200, None),
+    ("TestSequence", "ordering_history_days"): (int, 7, None),
+    ("PATHS", "wsconnector_path"): (str, None, None),
+    ("PATHS", "newtonsoftjson_path"): (str, None, None),
+    ("LOGFILES", "backend"): (str, "csv", ("csv", "sqlite")),
+    ("LOGFILES", "writer_mode"): (str, "direct", ("direct", "buffered")),
+    ("LOGFILES", "fsync_policy"): (str, "shutdown", ("row", "rows", "shutdown")),
+    ("LOGFILES", "fsync_rows"): (int, 10, None),
+    ("LOGFILES", "flush_rows"): (int, 10, None),
+    ("LOGFILES", "flush_seconds"): (float, 1.0, None),
+    ("LOGFILES", "archive"): (str, "off", ON_OFF),
+    ("LOGFILES", "multi_station"): (str, "off", ON_OFF),
+}
+
+# Type of every key of a section.
+section_types = {
+    "INSERT_CODE": int,
+    "StepDependencies": list,
+    "StepResources": list,
+    "StepTimeouts": float,
+}
+
+
+class Section(Mapping):
+    def __init__(self, name, values):
+        """
+        Initialize a read only section; values are reached as section['key'] or section.key.
+
+        Args:
+            name (str): The section name.
+            values (dict): The typed values by lowercase key.
+
+        Returns:
+            None
+        """
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "_values", dict(values))
+
+    def __getitem__(self, key):
+        return self._values[key.lower()]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __getattr__(self, key):
+        try:
+            return self._values[key.lower()]
+        except KeyError:
+            raise AttributeError(f"[{self.name}] has no setting '{key}'") from None
+
+    def __setattr__(self, key, value):
+        raise AttributeError("Settings are read only, edit settings.ini instead.")
+
+    def __repr__(self):
+        return f"Section({self.name!r}, {self._values!r})"
+
+
+class Settings(Mapping):
+    def __init__(self, sections, path=None, mtime=None):
+        """
+        Initialize the read only settings.
+
+        Sections are reached as settings['OPTIONS'] or settings.OPTIONS, and a key of any
+        section as settings.get('trace_enable') or settings.trace_enable; when several
+        sections have the key, the first one in the file wins, like get_value_ini.
+
+        Args:
+            sections (dict): The Section objects by name.
+            path (str, optional): The file the settings were read from. Defaults to None.
+            mtime (int, optional): The file modification time in ns. Defaults to None.
+
+        Returns:
+            None
+        """
+        keys = {}
+        for section in sections.values():
+            for key, value in section.items():
+                keys.setdefault(key, value)
+        object.__setattr__(self, "_sections", dict(sections))
+        object.__setattr__(self, "_keys", keys)
+        object.__setattr__(self, "path", path)
+        object.__setattr__(self, "mtime", mtime)
+
+    def __getitem__(self, section):
+        return self._sections[section]
+
+    def __iter__(self):
+        return iter(self._sections)
+
+    def __len__(self):
+        return len(self._sections)
+
+    def __getattr__(self, name):
+        if name in self._sections:
+            return self._sections[name]
+        try:
+            return self._keys[name.lower()]
+        except KeyError:
+            raise AttributeError(f"No setting '{name}'") from None
+
+    def __setattr__(self, key, value):
+        raise AttributeError("Settings are read only, edit settings.ini instead.")
+
+    def get(self, key, default=None):
+        """
+        Gets a key of any section.
+
+        Args:
+            key (str): The key name, case insensitive.
+            default (optional): Returned if no section has the key. Defaults to None.
+
+        Returns:
+            The typed value.
+        """
+        return self._keys.get(key.lower(), default)
+
+    def get_section(self, name):
+        """
+        Gets a section that may be missing from the file.
+
+        Args:
+            name (str): The section name.
+
+        Returns:
+            Section: The section, empty if the file does not have it.
+        """
+        return self._sections.get(name) or Section(name, {})
+
+    def as_list(self):
+        """
+        Gets the settings in the list of (section, dict) layout used by get_value_ini.
+
+        Returns:
+            list: A list of (section name, values dict) tuples.
+        """
+        return [(name, dict(section)) for name, section in self._sections.items()]
+
+
+def _convert(section, key, raw, value_type, choices):
+    """
+    Converts a raw string to its type and checks it is allowed.
+
+    Returns:
+        The typed value.
+
+    Raises:
+        SettingsError: If the value cannot be converted or is not allowed.
+    """
+    try:
+        if value_type is list:
+            value = [item.strip() for item in raw.split(",") if item.strip()]
+        elif value_type is str:
+            value = raw.strip()
+        else:
+            value = value_type(raw)
+    except ValueError:
+        raise SettingsError(f"[{section}] {key} = {raw!r} is not a valid {value_type.__name__}.") from None
+    if choices is not None:
+        value = value.lower()
+        if value not in choices:
+            raise SettingsError(f"[{section}] {key} = {raw!r} is not one of {', '.join(choices)}.")
+    return value
+
+
+def parse_settings(path=settings_path):
+    """
+    Parses and validates a settings file.
+
+    Args:
+        path (str, optional): The path to the settings file. Defaults to settings/settings.ini.
+
+    Returns:
+        Settings: The typed settings.
+
+    Raises:
+        SettingsError: If the file cannot be read, a required key is missing or a value is not valid.
+    """
+    config = ConfigParser()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+        with open(path, "r", encoding="utf-8") as file:
+            config.read_file(file)
+    except (OSError, ConfigParserError) as e:
+        raise SettingsError(f"The settings file {path} cannot be read: {e}") from None
+
+    values = {name: {} for name in config.sections()}
+    for name in config.sections():
+        for key, raw in config.items(name):
+            value_type, _, choices = schema.get((name, key), (section_types.get(name, str), None, None))
+            values[name][key] = _convert(name, key, raw, value_type, choices)
+
+    for (name, key), (_, default, _) in schema.items():
+        if key in values.get(name, {}):
+            continue
+        if default is None:
+            raise SettingsError(f"The required setting [{name}] {key} is missing in {path}.")
+        values.setdefault(name, {})[key] = default
+
+    sections = {name: Section(name, section) for name, section in values.items()}
+    return Settings(sections, path, mtime)
+
+
+class SettingsStore:
+    def __init__(self, path=settings_path, check_seconds=1.0):
+        """
+        Initialize the shared settings of a file, reloaded when the file changes.
+
+        Args:
+            path (str, optional): The path to the settings file. Defaults to settings/settings.ini.
+            check_seconds (float, optional): Minimum seconds between checks of the file modification time.
+                Defaults to 1.0.
+
+        Returns:
+            None
+        """
+        self.path = path
+        self.check_seconds = check_seconds
+        self.lock = Lock()
+        self.current = None
+        self.mtime = None
+        self.checked_at = None
+
+    def get(self):
+        """
+        Gets the current settings, reloading them first if the file changed.
+
+        A file that fails validation is logged and ignored, the previous settings are kept.
+
+        Returns:
+            Settings: The current settings.
+
+        Raises:
+            SettingsError: If the file is not valid on the first load.
+        """
+        now = time.monotonic()
+        if self.current is not None and now - self.checked_at < self.check_seconds:
+            return self.current
+        with self.lock:
+            self.checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                mtime = None
+            if self.current is None or mtime != self.mtime:
+                self._reload(mtime)
+            return self.current
+
+    def _reload(self, mtime):
+        """
+        Parses the file and swaps the current settings in a single assignment.
+
+        Returns:
+            None
+        """
+        try:
+            settings = parse_settings(self.path)
+        except SettingsError:
+            if self.current is None:
+                raise
+            logger.exception("The changed settings file is not valid, the previous settings are kept.")
+            self.mtime = mtime
+            return
+        if self.current is not None:
+            logger.debug(f"Settings reloaded from {self.path}")
+        self.current = settings
+        self.mtime = settings.mtime
+
+
+_store = SettingsStore()
+
+
+def get_settings():
+    """
+    Gets the settings of settings/settings.ini shared by every module.
+
+    Returns:
+        Settings: The current settings, reloaded if the file changed.
+    """
+    return _store.get()